@@ -1,8 +1,34 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import Any, List, Literal, Optional
 
 class InsightResponse(BaseModel):
     summary: str
     key_insights: List[str]
     risks: List[str]
     recommendations: List[str]
+
+
+# ---------- CHAT QUERY PLAN ----------
+
+class QueryFilter(BaseModel):
+    column: str
+    op: Literal["==", "!=", ">", ">=", "<", "<=", "in", "not_in", "contains", "is_null", "not_null"]
+    value: Any = None
+
+class QueryAggregation(BaseModel):
+    func: Literal["count", "sum", "mean", "median", "min", "max", "std", "nunique"]
+    column: Optional[str] = None
+
+class QuerySpec(BaseModel):
+    """
+    aggregate: filters -> group_by -> aggregations
+    rows: filters -> matching rows (optionally sorted)
+    none: not answerable by a query, fall back to row retrieval
+    """
+    mode: Literal["aggregate", "rows", "none"] = "none"
+    filters: List[QueryFilter] = Field(default_factory=list)
+    group_by: List[str] = Field(default_factory=list)
+    aggregations: List[QueryAggregation] = Field(default_factory=list)
+    sort_by: Optional[str] = None
+    descending: bool = True
+    limit: int = Field(default=20, ge=1, le=100)
@@ -0,0 +1,116 @@
+import os
+import pandas as pd
+from typing import List
+from pandas.api.types import is_numeric_dtype, is_datetime64_any_dtype
+from Agents.text_index import estimate_tokens
+
+
+# Per-dataset digest for the chat prompts, built once when a session is
+# created and stored with its metadata. It describes every column it can
+# within the token budget (type, known values or range) and adds a few
+# sample rows with long cells cut. Columns of wide schemas that do not fit
+# are summarized by type and listed by name.
+
+
+CHAT_DATASET_CONTEXT_TOKENS = int(os.getenv("CHAT_DATASET_CONTEXT_TOKENS", "1000"))
+CONTEXT_SAMPLE_ROWS = 3
+MAX_CELL_CHARS = 40
+MAX_LISTED_VALUES = 12
+
+
+def truncate_cell(value, max_chars: int = MAX_CELL_CHARS) -> str:
+    text = "" if value is None or (not isinstance(value, str) and pd.isna(value)) else str(value)
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars - 3] + "..."
+
+
+def format_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return truncate_cell(value)
+
+
+def describe_column(series: pd.Series) -> str:
+    line = f"- {series.name} ({series.dtype})"
+    if is_numeric_dtype(series) or is_datetime64_any_dtype(series):
+        values = series.dropna()
+        if not values.empty:
+            line += f": {format_value(values.min())} to {format_value(values.max())}"
+    elif series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype):
+        uniques = series.dropna().unique()
+        if len(uniques) <= MAX_LISTED_VALUES:
+            line += ": values " + ", ".join(sorted(truncate_cell(v) for v in uniques))
+        else:
+            line += f": {len(uniques)} distinct values"
+    nulls = int(series.isna().sum())
+    if nulls:
+        line += f", {nulls} missing"
+    return line
+
+
+def sample_rows(df: pd.DataFrame, columns: List[str], max_tokens: int) -> List[str]:
+    sample = df[columns].head(CONTEXT_SAMPLE_ROWS)
+    lines = [",".join(truncate_cell(c) for c in columns)]
+    for row in sample.itertuples(index=False):
+        lines.append(",".join(truncate_cell(v) for v in row))
+    kept, used = [], 0
+    for line in lines:
+        used += estimate_tokens(line)
+        if used > max_tokens:
+            break
+        kept.append(line)
+    return kept if len(kept) > 1 else []
+
+
+def names_within_budget(names: List[str], max_tokens: int) -> str:
+    kept, used = [], 0
+    for name in names:
+        used += estimate_tokens(name + ", ")
+        if used > max_tokens:
+            break
+        kept.append(name)
+    more = f" and {len(names) - len(kept)} more" if len(kept) < len(names) else ""
+    return ", ".join(kept) + more
+
+
+def build_dataset_context(df: pd.DataFrame, max_tokens: int = CHAT_DATASET_CONTEXT_TOKENS) -> str:
+    """
+    Schema lines take up to three quarters of the budget, sample rows the rest.
+    Columns are described while the names of all the others still fit, those
+    are then listed by name so the query planner can still use them.
+    """
+    lines = [f"Rows: {len(df)}, Columns: {len(df.columns)}", "Columns:"]
+    used = sum(estimate_tokens(line) for line in lines)
+    schema_budget = max_tokens * 3 // 4
+
+    names = [str(c) for c in df.columns]
+    # tokens needed to list the names of columns i and after
+    names_after = [0] * (len(names) + 1)
+    for i in range(len(names) - 1, -1, -1):
+        names_after[i] = names_after[i + 1] + estimate_tokens(names[i] + ", ")
+
+    described: List[str] = []
+    for i, col in enumerate(df.columns):
+        line = describe_column(df[col])
+        cost = estimate_tokens(line)
+        if used + cost + names_after[i + 1] > schema_budget:
+            break
+        lines.append(line)
+        described.append(col)
+        used += cost
+
+    rest = df.columns[len(described):]
+    if len(rest):
+        by_type = df[rest].dtypes.astype(str).value_counts()
+        summary = "; ".join(f"{count} {dtype}" for dtype, count in by_type.items())
+        head = f"- {len(rest)} more columns ({summary}): "
+        # names come before sample rows, they may use the whole remaining budget
+        line = head + names_within_budget(names[len(described):], max_tokens - used - estimate_tokens(head))
+        lines.append(line)
+        used += estimate_tokens(line)
+
+    rows = sample_rows(df, described, max_tokens - used - estimate_tokens("Sample rows:")) if described else []
+    if rows:
+        lines.append("Sample rows:")
+        lines.extend(rows)
+    return "\n".join(lines)
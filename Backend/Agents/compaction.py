@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Tuple
+from pandas.api.types import is_float_dtype, is_integer_dtype
+
+
+# Shrink the cleaned frame before it is shared with the rest of the pipeline:
+# - integers downcast to the smallest type holding their range
+# - floats go to float32 only when every value round-trips exactly
+# - repetitive string columns become categoricals
+
+
+CATEGORY_MAX_RATIO = float(os.getenv("CATEGORY_MAX_RATIO", "0.5"))
+
+
+INTEGER_DTYPES = ("int8", "int16", "int32", "int64")
+
+
+def integer_dtype_for(low: float, high: float) -> str:
+    for dtype in INTEGER_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return "int64"
+
+
+def float32_exact(values) -> bool:
+    values = np.asarray(values, dtype="float64")
+    with np.errstate(over="ignore", invalid="ignore"):
+        return np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True)
+
+
+def downcast_numeric(series: pd.Series) -> pd.Series:
+    if is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    if is_float_dtype(series) and series.dtype != np.float32:
+        values = series.to_numpy()
+        if float32_exact(values):
+            return pd.Series(values.astype(np.float32), index=series.index, name=series.name)
+    return series
+
+
+def compact_strings(series: pd.Series) -> pd.Series:
+    if len(series) == 0:
+        return series
+    if series.nunique(dropna=True) / len(series) <= CATEGORY_MAX_RATIO:
+        return series.astype("category")
+    return series
+
+
+def compact_dataframe(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Columns are replaced in place, returns the frame and a memory report.
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    changed = {}
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == "object":
+            compacted = compact_strings(series)
+        else:
+            compacted = downcast_numeric(series)
+        if compacted.dtype != series.dtype:
+            df[col] = compacted
+            changed[col] = f"{series.dtype} -> {compacted.dtype}"
+
+    after = int(df.memory_usage(deep=True).sum())
+    print(f"Dataframe compacted ====> {before} bytes -> {after} bytes")
+    return df, {
+        "bytes_before": before,
+        "bytes_after": after,
+        "converted_columns": changed
+    }
+
+
+def apply_compaction(chunk: pd.DataFrame, plan: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Casts a chunk to dtypes decided up front, so every chunk of a streamed
+    file gets the same compact schema.
+    """
+    for col, dtype in plan.items():
+        chunk[col] = chunk[col].astype(dtype)
+    return chunk
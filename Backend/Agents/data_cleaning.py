@@ -2,6 +2,9 @@ import os
 import pandas as pd
 from typing_extensions import TypedDict,Dict,List,Literal,Any
 import numpy as np
+from Agents.type_inference import infer_types
+from Agents.compaction import compact_dataframe
+from Agents.dedup import row_hashes, first_occurrence, take_rows
 
 
 # Read CSV into Pandas
@@ -39,14 +42,7 @@ def normalize_column_name(df:pd.DataFrame):
 
 
 def Infer_datatypes(df: pd.DataFrame) -> pd.DataFrame:
-    for col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors="ignore")
-
-        if df[col].dtype == "object":
-            try:
-                df[col] = pd.to_datetime(df[col])
-            except Exception:
-                pass
+    df, _ = infer_types(df)
     print("Datatypes inferred successfully............") 
     return df
 
@@ -57,45 +53,48 @@ def handle_missing_values(df: pd.DataFrame) -> pd.DataFrame:
     numerical columns: fill with median (more robust to outliers than mean)
     categorical columns: fill with mode
     binary columns: fill with mode
+    Fill values are collected first and applied in one in-place fillna.
     """
-    
-    df_copy = df.copy()  
-    
-    for col in df_copy.columns:
-        if df_copy[col].isnull().sum() > 0:
-            if df_copy[col].dtype == "object":
-                mode_values = df_copy[col].mode()
-                if not mode_values.empty:
-                    df_copy[col].fillna(mode_values[0], inplace=True)
-                else:
-                    df_copy[col].fillna("Unknown", inplace=True)
-            
-            elif np.issubdtype(df_copy[col].dtype, np.number):
-                median_value = df_copy[col].median()
-                df_copy[col].fillna(median_value, inplace=True)
-            
-            elif df_copy[col].dtype == "bool":
-                mode_values = df_copy[col].mode()
-                if not mode_values.empty:
-                    df_copy[col].fillna(mode_values[0], inplace=True)
-                else:
-                    df_copy[col].fillna(False, inplace=True)
+    fills = {}
+    for col, nulls in df.isnull().sum().items():
+        if nulls == 0:
+            continue
+        if df[col].dtype == "object":
+            mode_values = df[col].mode()
+            fills[col] = mode_values[0] if not mode_values.empty else "Unknown"
+
+        elif np.issubdtype(df[col].dtype, np.number):
+            fills[col] = df[col].median()
+
+        elif df[col].dtype == "bool":
+            mode_values = df[col].mode()
+            fills[col] = mode_values[0] if not mode_values.empty else False
+
+    if fills:
+        df.fillna(value=fills, inplace=True)
     print("Missing Value Handeld Successfully..........")
-    return df_copy
+    return df
 
-def remove_duplicates(df: pd.DataFrame) -> pd.DataFrame:
+def remove_duplicates(df: pd.DataFrame, hashes: np.ndarray = None):
     """
-    Remove duplicate rows
+    Remove duplicate rows by comparing one 64-bit hash per row.
+    Pass hashes to reuse them, returns the frame, the hashes of the
+    kept rows and the number of rows removed.
     """
-    print('Duplicate remove successfully........')
-    return df.drop_duplicates()
-
-def generate_metadata(df: pd.DataFrame) -> Dict[str, Any]:
+    if hashes is None:
+        hashes = row_hashes(df)
+    keep = first_occurrence(hashes)
+    removed = int(len(keep) - keep.sum())
+    print(f'Duplicate remove successfully ====> {removed} rows')
+    return take_rows(df, keep), hashes[keep], removed
+
+def generate_metadata(df: pd.DataFrame, duplicates_removed: int = 0) -> Dict[str, Any]:
     return {
         "rows": int(df.shape[0]),
+        "duplicates_removed": int(duplicates_removed),
         "columns": list(df.columns),
         "numeric_columns": df.select_dtypes(include="number").columns.tolist(),
-        "categorical_columns": df.select_dtypes(include="object").columns.tolist(),
+        "categorical_columns": df.select_dtypes(include=["object", "category"]).columns.tolist(),
         "datetime_columns": df.select_dtypes(include="datetime").columns.tolist(),
         "missing_values": {
             col: int(val) for col, val in df.isnull().sum().items()
@@ -110,11 +109,27 @@ def Preprocess_data(file_path:str):
     try:
         df = LoadData(file_path)
         df = normalize_column_name(df)
-        df = remove_duplicates(df) 
-        df = Infer_datatypes(df)
+        df, type_report = infer_types(df)
+        print(f"Datatypes inferred in {type_report['elapsed_ms']} ms............")
+        # rows are hashed once after inference, so values that only match
+        # once typed ("1" / "1.0") are caught by the same pass
+        df, hashes, duplicates = remove_duplicates(df)
+        imputed = df.isnull().any(axis=1).to_numpy()
+        dtypes = df.dtypes
         df = handle_missing_values(df)
-        df = remove_duplicates(df)
-        metadata = generate_metadata(df)
+        if imputed.any():
+            if df.dtypes.equals(dtypes):
+                # only imputed rows can have become duplicates, rehash just those
+                hashes[imputed] = row_hashes(df[imputed])
+            else:
+                # a fill changed a column's dtype, which changes every row's hash
+                hashes = row_hashes(df)
+            df, _, collisions = remove_duplicates(df, hashes)
+            duplicates += collisions
+        df, memory_report = compact_dataframe(df)
+        metadata = generate_metadata(df, duplicates)
+        metadata["type_inference"] = type_report
+        metadata["memory"] = memory_report
         
         return {
             "dataframe": df,
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+
+# Hash-based row deduplication.
+# Every row is reduced to one 64-bit hash with a vectorized row hash, duplicates
+# are found by comparing hashes only. The set of seen hashes is kept as a few
+# sorted uint64 runs (8 bytes per unique row) so it can grow across chunks of
+# a streaming ingest without holding the rows themselves.
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """
+    Floats are hashed by their bits, adding 0.0 folds -0.0 into 0.0 so the
+    hashes agree with drop_duplicates.
+    """
+    floats = df.select_dtypes(include="floating").columns
+    if len(floats):
+        df = df.copy(deep=False)
+        for col in floats:
+            df[col] = df[col] + 0.0
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype="uint64")
+
+
+def first_occurrence(hashes: np.ndarray) -> np.ndarray:
+    """
+    True for the first row of every hash, same as drop_duplicates(keep="first").
+    """
+    return ~pd.Series(hashes, copy=False).duplicated().to_numpy()
+
+
+def take_rows(df: pd.DataFrame, keep: np.ndarray) -> pd.DataFrame:
+    """
+    take() gives an independent frame, later in-place fills do not warn.
+    """
+    if keep.all():
+        return df
+    return df.take(np.flatnonzero(keep))
+
+
+def merge_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Linear merge of two sorted runs.
+    """
+    return np.insert(a, np.searchsorted(a, b), b)
+
+
+class HashSet:
+    """
+    Sorted runs of uint64 hashes, each run more than twice the size of the
+    next one. A new run is merged into the smaller runs before it, like
+    carries in a binary counter, so there are at most log2(n) runs and every
+    hash takes part in O(log n) merges.
+    """
+
+    def __init__(self):
+        self.runs: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self.runs)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(run.nbytes for run in self.runs)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            positions = np.searchsorted(run, hashes)
+            positions[positions == len(run)] = 0
+            found |= run[positions] == hashes
+        return found
+
+    def add(self, hashes: np.ndarray):
+        """
+        hashes must not already be in the set.
+        """
+        if len(hashes) == 0:
+            return
+        run = np.sort(hashes)
+        while self.runs and len(self.runs[-1]) <= 2 * len(run):
+            run = merge_sorted(self.runs.pop(), run)
+        self.runs.append(run)
+
+
+class RowDeduplicator:
+    """
+    Drops rows already seen in this or any earlier chunk.
+    """
+
+    def __init__(self):
+        self.seen = HashSet()
+        self.duplicates = 0
+
+    def keep_mask(self, hashes: np.ndarray) -> np.ndarray:
+        keep = first_occurrence(hashes)
+        if self.seen.runs:
+            keep &= ~self.seen.contains(hashes)
+        self.seen.add(hashes[keep])
+        self.duplicates += int(len(hashes) - keep.sum())
+        return keep
+
+    def filter(self, chunk: pd.DataFrame, hashes: Optional[np.ndarray] = None) -> pd.DataFrame:
+        if hashes is None:
+            hashes = row_hashes(chunk)
+        return take_rows(chunk, self.keep_mask(hashes))
@@ -1,8 +1,14 @@
 import pandas as pd
 import numpy as np
 import os
+import warnings
 from typing import Dict,Any,List
 from Agents.data_cleaning import Preprocess_data
+from Agents.sketches import APPROX_CHUNK_ROWS, QuantileSketch, sketch_categorical, use_approximate
+
+
+CORRELATION_SAMPLE_ROWS = 200_000
+APPROX_CATEGORY_TOP_K = 50
 
 
 def dataset_overview(df:pd.DataFrame)->Dict[str, int]:
@@ -16,30 +22,189 @@ def dataset_overview(df:pd.DataFrame)->Dict[str, int]:
 def columns_types(df:pd.DataFrame)->Dict[str, List]:
     return{
         "numeric" : df.select_dtypes(include="number").columns.tolist(),
-        "categorical" : df.select_dtypes(include="object").columns.tolist(),
+        "categorical" : df.select_dtypes(include=["object", "category"]).columns.tolist(),
         "datetime": df.select_dtypes(include="datetime").columns.tolist()
     }
 
 
-def Summary_statistics(df:pd.DataFrame)->Dict[str,Dict[str,float]]:
-    stats = {}
-    numeric_cols = df.select_dtypes(include="number")
-    for col in numeric_cols.columns:
-        stats[col] = {
-            "count": int(numeric_cols[col].count()),
-            "mean": float(numeric_cols[col].mean()),
-            "median": float(numeric_cols[col].median()),
-            "std": float(numeric_cols[col].std()),
-            "min": float(numeric_cols[col].min()),
-            "max": float(numeric_cols[col].max())
+def _sorted_quantiles(sorted_block: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """
+    Linear-interpolated quantile per column of a column-sorted block whose
+    NaNs sit at the bottom (same method as pandas' default).
+    """
+    cols = np.arange(sorted_block.shape[1])
+    pos = q * np.maximum(counts - 1, 0)
+    lo = np.floor(pos).astype(int)
+    hi = np.ceil(pos).astype(int)
+    low_values = sorted_block[lo, cols]
+    high_values = sorted_block[hi, cols]
+    result = low_values + (pos - lo) * (high_values - low_values)
+    return np.where(counts > 0, result, np.nan)
+
+
+def numeric_profile(df: pd.DataFrame, numeric_cols: List[str] = None) -> Dict[str, Any]:
+    """
+    Fused numeric EDA: the numeric columns are taken once as a 2-D float block,
+    then moments, quantiles, IQR bounds, outlier and null counts come from a
+    handful of column-wise reductions instead of one pandas call per column.
+    """
+    if numeric_cols is None:
+        numeric_cols = df.select_dtypes(include="number").columns.tolist()
+    if not numeric_cols:
+        return {"columns": [], "block": np.empty((len(df), 0)), "summary_statistics": {}, "outliers": {}}
+
+    block = df[numeric_cols].to_numpy(dtype="float64", na_value=np.nan)
+
+    with warnings.catch_warnings(), np.errstate(all="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        valid = ~np.isnan(block)
+        counts = valid.sum(axis=0)
+        sums = np.where(valid, block, 0.0).sum(axis=0)
+        mean = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        centered = np.where(valid, block - mean, 0.0)
+        var = (centered ** 2).sum(axis=0) / (counts - 1)
+        std = np.where(counts > 1, np.sqrt(var), np.nan)
+
+        sorted_block = np.sort(block, axis=0)
+        q1 = _sorted_quantiles(sorted_block, counts, 0.25)
+        median = _sorted_quantiles(sorted_block, counts, 0.5)
+        q3 = _sorted_quantiles(sorted_block, counts, 0.75)
+        minimum = _sorted_quantiles(sorted_block, counts, 0.0)
+        maximum = _sorted_quantiles(sorted_block, counts, 1.0)
+        del sorted_block
+
+        iqr = q3 - q1
+        lower = q1 - 1.5 * iqr
+        upper = q3 + 1.5 * iqr
+        outlier_counts = ((block < lower) | (block > upper)).sum(axis=0)
+
+    summary = {}
+    outliers = {}
+    for i, col in enumerate(numeric_cols):
+        summary[col] = {
+            "count": int(counts[i]),
+            "mean": float(mean[i]),
+            "median": float(median[i]),
+            "std": float(std[i]),
+            "min": float(minimum[i]),
+            "max": float(maximum[i])
+        }
+        outliers[col] = {
+            "lower_bound": float(lower[i]),
+            "upper_bound": float(upper[i]),
+            "outliers_count": int(outlier_counts[i])
         }
-    return stats
+
+    return {
+        "columns": numeric_cols,
+        "block": block,
+        "summary_statistics": summary,
+        "outliers": outliers
+    }
+
+
+def approx_numeric_profile(
+    df: pd.DataFrame,
+    numeric_cols: List[str],
+    chunk_rows: int = APPROX_CHUNK_ROWS
+) -> Dict[str, Any]:
+    """
+    Approximate counterpart of numeric_profile for very large frames.
+    Count/mean/std/min/max stay exact (merged per chunk), median and IQR
+    bounds come from quantile sketches, correlations from a row sample.
+    """
+    k = len(numeric_cols)
+    count = np.zeros(k)
+    mean = np.zeros(k)
+    m2 = np.zeros(k)
+    minimum = np.full(k, np.inf)
+    maximum = np.full(k, -np.inf)
+    sketches = [QuantileSketch(seed=i) for i in range(k)]
+
+    def blocks():
+        for start in range(0, len(df), chunk_rows):
+            # rows first: a row slice is a view, only the chunk's numeric columns get copied
+            yield df.iloc[start:start + chunk_rows][numeric_cols].to_numpy(dtype="float64", na_value=np.nan)
+
+    with warnings.catch_warnings(), np.errstate(all="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for block in blocks():
+            valid = ~np.isnan(block)
+            c = valid.sum(axis=0)
+            c_mean = np.where(valid, block, 0.0).sum(axis=0) / np.maximum(c, 1)
+            c_m2 = (np.where(valid, block - c_mean, 0.0) ** 2).sum(axis=0)
+
+            total = count + c
+            delta = c_mean - mean
+            mean = np.where(total > 0, mean + delta * c / np.maximum(total, 1), 0.0)
+            m2 = m2 + c_m2 + delta ** 2 * count * c / np.maximum(total, 1)
+            count = total
+            minimum = np.minimum(minimum, np.where(valid, block, np.inf).min(axis=0))
+            maximum = np.maximum(maximum, np.where(valid, block, -np.inf).max(axis=0))
+            for i, sketch in enumerate(sketches):
+                sketch.update(block[:, i])
+
+        quartiles = np.array([s.quantiles([0.25, 0.5, 0.75]) for s in sketches]).reshape(k, 3)
+        q1, median, q3 = quartiles[:, 0], quartiles[:, 1], quartiles[:, 2]
+        iqr = q3 - q1
+        lower = q1 - 1.5 * iqr
+        upper = q3 + 1.5 * iqr
+        outlier_counts = np.zeros(k, dtype="int64")
+        for block in blocks():
+            outlier_counts += ((block < lower) | (block > upper)).sum(axis=0)
+
+        std = np.where(count > 1, np.sqrt(m2 / (count - 1)), np.nan)
+        mean = np.where(count > 0, mean, np.nan)
+        minimum = np.where(count > 0, minimum, np.nan)
+        maximum = np.where(count > 0, maximum, np.nan)
+
+    sample = df
+    if len(sample) > CORRELATION_SAMPLE_ROWS:
+        sample = sample.sample(n=CORRELATION_SAMPLE_ROWS, random_state=0)
+    sample = sample[numeric_cols]
+
+    summary = {}
+    outliers = {}
+    approximation = {}
+    for i, col in enumerate(numeric_cols):
+        summary[col] = {
+            "count": int(count[i]),
+            "mean": float(mean[i]),
+            "median": float(median[i]),
+            "std": float(std[i]),
+            "min": float(minimum[i]),
+            "max": float(maximum[i])
+        }
+        outliers[col] = {
+            "lower_bound": float(lower[i]),
+            "upper_bound": float(upper[i]),
+            "outliers_count": int(outlier_counts[i])
+        }
+        approximation[col] = {
+            "quantile_rank_error": sketches[i].rank_error()
+        }
+
+    return {
+        "columns": numeric_cols,
+        "block": sample.to_numpy(dtype="float64", na_value=np.nan),
+        "summary_statistics": summary,
+        "outliers": outliers,
+        "approximation": {
+            "method": "quantile sketch (median, IQR bounds), exact moments",
+            "correlation_sample_rows": int(len(sample)),
+            "columns": approximation
+        }
+    }
+
+
+def Summary_statistics(df:pd.DataFrame)->Dict[str,Dict[str,float]]:
+    return numeric_profile(df)["summary_statistics"]
 
 
 
 def categorical_distribution(df:pd.DataFrame)->Dict[str,Dict[str,int]]:
     distributions = {}
-    cat_cols = df.select_dtypes(include="object")
+    cat_cols = df.select_dtypes(include=["object", "category"])
     for col in cat_cols.columns:
         value_counts = cat_cols[col].value_counts()
         distributions[col]={
@@ -47,65 +212,112 @@ def categorical_distribution(df:pd.DataFrame)->Dict[str,Dict[str,int]]:
         }
     return distributions
 
-def correlations(df:pd.DataFrame):
+def approx_categorical_distribution(
+    df: pd.DataFrame,
+    categorical_cols: List[str],
+    top_k: int = APPROX_CATEGORY_TOP_K
+):
+    """
+    Heavy-hitter top-k per column plus a distinct-count estimate,
+    each with its error bound.
+    """
+    distributions = {}
+    approximation = {}
+    for col in categorical_cols:
+        sketch = sketch_categorical(df[col], top_k, APPROX_CHUNK_ROWS)
+        distributions[col] = {str(k): int(v) for k, v in sketch["top"]}
+        approximation[col] = {
+            "distinct_estimate": sketch["distinct_estimate"],
+            "distinct_relative_error": sketch["distinct_relative_error"],
+            "count_error_bound": sketch["count_error_bound"],
+            "tail_count_at_most": sketch["tail_count_at_most"]
+        }
+    return distributions, {
+        "method": "misra-gries top-k, hyperloglog distinct count",
+        "top_k": top_k,
+        "columns": approximation
+    }
+
+def pairwise_correlation(block: np.ndarray) -> np.ndarray:
+    """
+    Pearson correlation over pairwise-complete rows (what DataFrame.corr does)
+    expressed as a few matrix products instead of one pass per column pair.
+    """
+    valid = ~np.isnan(block)
+    mask = valid.astype("float64")
+    with np.errstate(all="ignore"):
+        centered = np.where(valid, block - np.nanmean(block, axis=0), 0.0)
+        n = mask.T @ mask
+        sx = centered.T @ mask
+        sxx = (centered ** 2).T @ mask
+        sxy = centered.T @ centered
+        cov = n * sxy - sx * sx.T
+        var = (n * sxx - sx ** 2) * (n * sxx - sx ** 2).T
+        corr = cov / np.sqrt(var)
+    return np.clip(corr, -1.0, 1.0)
+
+
+def correlations(df:pd.DataFrame, profile: Dict[str, Any] = None):
     corr_result = {}
-    numeric_df = df.select_dtypes(include="number")
+    if profile is None:
+        profile = numeric_profile(df)
+    numeric_cols = profile["columns"]
 
-    if numeric_df.shape[1] < 2:
+    if len(numeric_cols) < 2:
         return corr_result
 
-    corr_matrix = numeric_df.corr()
-    for col1 in corr_matrix.columns:
-        for col2 in corr_matrix.columns:
+    corr_matrix = pairwise_correlation(profile["block"])
+
+    for i, col1 in enumerate(numeric_cols):
+        for j, col2 in enumerate(numeric_cols):
             if col1 < col2:
-                corr_result[f"{col1}_vs_{col2}"] = float(
-                    corr_matrix.loc[col1, col2]
-                )
+                corr_result[f"{col1}_vs_{col2}"] = float(corr_matrix[i, j])
 
     return corr_result
 
 def missing_values(df: pd.DataFrame) -> Dict[str, int]:
         return {
-            col: int(df[col].isnull().sum())
-            for col in df.columns
+            col: int(val)
+            for col, val in df.isna().sum().items()
         }
 
 def detect_outliers(df: pd.DataFrame) -> Dict[str, Dict[str, float]]:
-        outliers = {}
-        numeric_cols = df.select_dtypes(include="number")
-
-        for col in numeric_cols.columns:
-            q1 = numeric_cols[col].quantile(0.25)
-            q3 = numeric_cols[col].quantile(0.75)
-            iqr = q3 - q1
-
-            lower = q1 - 1.5 * iqr
-            upper = q3 + 1.5 * iqr
+        return numeric_profile(df)["outliers"]
 
-            count = int(((numeric_cols[col] < lower) | (numeric_cols[col] > upper)).sum())
 
-            outliers[col] = {
-                "lower_bound": float(lower),
-                "upper_bound": float(upper),
-                "outliers_count": count
-            }
-
-        return outliers
-
-
-def run_eda_agent(df: pd.DataFrame):
+def run_eda_agent(df: pd.DataFrame, approximate: bool = None):
     """
     This agent will basically create the deep analysis of the data.
+    approximate=None follows APPROX_STATS_MIN_ROWS (off by default).
     """
-    return {
+    if approximate is None:
+        approximate = use_approximate(len(df))
+
+    column_types = columns_types(df)
+    if approximate:
+        profile = approx_numeric_profile(df, column_types["numeric"])
+        distributions, categorical_approximation = approx_categorical_distribution(
+            df, column_types["categorical"]
+        )
+    else:
+        profile = numeric_profile(df, column_types["numeric"])
+        distributions = categorical_distribution(df)
+
+    result = {
         "overview": dataset_overview(df),
-        "column_types": columns_types(df),
-        "summary_statistics": Summary_statistics(df),
-        "categorical_distributions": categorical_distribution(df),
-        "correlations": correlations(df),
+        "column_types": column_types,
+        "summary_statistics": profile["summary_statistics"],
+        "categorical_distributions": distributions,
+        "correlations": correlations(df, profile),
         "missing_values": missing_values(df),
-        "outliers": detect_outliers(df)
+        "outliers": profile["outliers"]
     }
+    if approximate:
+        result["approximation"] = {
+            "numeric": profile["approximation"],
+            "categorical": categorical_approximation
+        }
+    return result
 
 
 if __name__ == "__main__":
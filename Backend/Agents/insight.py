@@ -1,23 +1,28 @@
 from dotenv import load_dotenv
 import os
+import asyncio
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from pydantic import ValidationError
 from Agents.Schemas import InsightResponse
-import re
+from Agents.text_index import estimate_tokens
+from Agents.json_stream import JSONStreamParser
+from Core.llm import gateway
+from Core.cache import DiskCache, content_hash
 import json
 import warnings
 warnings.filterwarnings("ignore")
 
 load_dotenv()
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+INSIGHT_TIMEOUT_SECONDS = float(os.getenv("INSIGHT_TIMEOUT_SECONDS", "90"))
+INSIGHT_CONTEXT_TOKENS = int(os.getenv("INSIGHT_CONTEXT_TOKENS", "3000"))
+INSIGHT_TOP_CATEGORIES = 5
+INSIGHT_LISTED_COLUMNS = 60
+# bump when the digest or the parsing changes what insights a context gets
+INSIGHT_PIPELINE_VERSION = "1"
 
-Model = ChatGroq(
-    model="openai/gpt-oss-20b",
-    temperature=0.3,
-    api_key=GROQ_API_KEY
-)
+Model = gateway.client(temperature=0.3)
 
 prompt = ChatPromptTemplate.from_messages([
     ("system", """
@@ -45,54 +50,271 @@ def sanitize(obj: Any) -> Any:
     return obj
 
 
-def prepare_insight_context(eda: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
-    return sanitize({
-        "overview": eda.get("overview", {}),
-        "column_types": eda.get("column_types", {}),
-        "summary_statistics": eda.get("summary_statistics", {}),
-        "categorical_distributions": eda.get("categorical_distributions", {}),
-        "correlations": eda.get("correlations", {}),
-        "outliers": eda.get("outliers", {}),
-        "missing_values": eda.get("missing_values", {}),
+def _round(value: Any) -> Any:
+    if isinstance(value, float):
+        return float(f"{value:.4g}")
+    return value
+
+
+def _fit(items: List[Tuple[str, Any]], max_tokens: int) -> Dict[str, Any]:
+    """
+    Ranked (key, fact) pairs, taken in order while they fit the budget.
+    """
+    kept, used = {}, 0
+    for key, fact in items:
+        cost = estimate_tokens(json.dumps({key: fact}, default=str))
+        if used + cost > max_tokens:
+            break
+        kept[key] = fact
+        used += cost
+    return kept
+
+
+def rank_correlations(correlations: Dict[str, float]) -> List[Tuple[str, Any]]:
+    pairs = [(k, v) for k, v in correlations.items() if v is not None and v == v]
+    pairs.sort(key=lambda kv: (-abs(kv[1]), kv[0]))
+    return [(k, _round(v)) for k, v in pairs]
+
+
+def rank_missing(missing: Dict[str, int], rows: int) -> List[Tuple[str, Any]]:
+    cols = sorted(((c, n) for c, n in missing.items() if n), key=lambda cn: (-cn[1], cn[0]))
+    return [(c, {"missing": n, "share": _round(n / rows) if rows else None}) for c, n in cols]
+
+
+def rank_outliers(outliers: Dict[str, Dict[str, Any]], rows: int) -> List[Tuple[str, Any]]:
+    cols = sorted(
+        ((c, o) for c, o in outliers.items() if o.get("outliers_count")),
+        key=lambda co: (-co[1]["outliers_count"], co[0])
+    )
+    return [
+        (c, {
+            "outliers": o["outliers_count"],
+            "share": _round(o["outliers_count"] / rows) if rows else None,
+            "bounds": [_round(o["lower_bound"]), _round(o["upper_bound"])]
+        })
+        for c, o in cols
+    ]
+
+
+def rank_numeric(summary: Dict[str, Dict[str, Any]], priority: List[str]) -> List[Tuple[str, Any]]:
+    """
+    Columns that appear in the other ranked facts first, then by name.
+    """
+    first = {c: i for i, c in enumerate(dict.fromkeys(priority))}
+    cols = sorted(summary, key=lambda c: (first.get(c, len(first)), c))
+    return [(c, {k: _round(v) for k, v in summary[c].items()}) for c in cols]
+
+
+def rank_categories(distributions: Dict[str, Dict[str, int]]) -> List[Tuple[str, Any]]:
+    """
+    Top categories plus the mass of the tail. Columns with almost one value
+    per row are identifier-like and only reported by their distinct count.
+    Lower-cardinality columns rank first.
+    """
+    facts = []
+    for col, counts in distributions.items():
+        total = sum(counts.values())
+        distinct = len(counts)
+        if total and distinct > INSIGHT_TOP_CATEGORIES and distinct >= 0.9 * total:
+            facts.append((distinct, col, {"distinct": distinct, "identifier_like": True}))
+            continue
+        top = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:INSIGHT_TOP_CATEGORIES]
+        fact = {"distinct": distinct, "top": {k: v for k, v in top}}
+        tail = total - sum(v for _, v in top)
+        if tail:
+            fact["tail_share"] = _round(tail / total)
+        facts.append((distinct, col, fact))
+    facts.sort(key=lambda f: (f[2].get("identifier_like", False), f[0], f[1]))
+    return [(col, fact) for _, col, fact in facts]
+
+
+def prepare_insight_context(
+    eda: Dict[str, Any],
+    metadata: Dict[str, Any],
+    max_tokens: int = INSIGHT_CONTEXT_TOKENS
+) -> Dict[str, Any]:
+    """
+    Ranked digest of the EDA for the prompt. Each section keeps its most
+    informative facts within its share of max_tokens, so the prompt size
+    stays flat however wide the dataset is. Ties are broken by name.
+    """
+    eda = sanitize(eda)
+    overview = eda.get("overview", {})
+    rows = overview.get("rows") or metadata.get("rows") or 0
+    column_types = eda.get("column_types", {})
+    columns = metadata.get("columns") or []
+
+    correlations = rank_correlations(eda.get("correlations", {}))
+    missing = rank_missing(eda.get("missing_values", {}), rows)
+    outliers = rank_outliers(eda.get("outliers", {}), rows)
+    priority = [c for k, _ in correlations[:10] for c in k.split("_vs_")] + [c for c, _ in outliers]
+    numeric = rank_numeric(eda.get("summary_statistics", {}), priority)
+    categories = rank_categories(eda.get("categorical_distributions", {}))
+
+    return {
+        "overview": overview,
+        "column_types": {kind: len(cols) for kind, cols in column_types.items()},
+        "strongest_correlations": _fit(correlations, max_tokens * 15 // 100),
+        "missing_values": _fit(missing, max_tokens * 10 // 100),
+        "outliers": _fit(outliers, max_tokens * 15 // 100),
+        "summary_statistics": _fit(numeric, max_tokens * 30 // 100),
+        "categorical_distributions": _fit(categories, max_tokens * 20 // 100),
         "dataset_info": {
             "rows": metadata.get("rows"),
-            "columns": metadata.get("columns")
+            "columns": columns[:INSIGHT_LISTED_COLUMNS],
+            "more_columns": max(len(columns) - INSIGHT_LISTED_COLUMNS, 0)
         }
-    })
+    }
 
 
-def insight_agent(eda: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
-    clean_eda = prepare_insight_context(eda, metadata)
+EMPTY_INSIGHTS = {
+    "summary": "",
+    "key_insights": [],
+    "risks": [],
+    "recommendations": []
+}
+
+
+# Insights keyed by the EDA digest, files that clean to the same statistics share them
+INSIGHT_CACHE = DiskCache(
+    "insights",
+    max_bytes=int(os.getenv("INSIGHT_CACHE_MAX_MB", "64")) * 1024 * 1024,
+    ttl_seconds=int(os.getenv("INSIGHT_CACHE_TTL_SECONDS", str(7 * 86400)))
+)
+
+
+def build_insight_messages(eda: Dict[str, Any], metadata: Dict[str, Any]):
+    return insight_messages(prepare_insight_context(eda, metadata))
+
 
-    response = Model.invoke(
-        prompt.format_messages(
-            eda=clean_eda,
-            metadata=clean_eda["dataset_info"]
-        )
+def insight_messages(clean_eda: Dict[str, Any]):
+    return prompt.format_messages(
+        eda=clean_eda,
+        metadata=clean_eda["dataset_info"]
     )
 
-    text = response.content or ""
 
-    match = re.search(r"\{.*\}", text, re.DOTALL)
-    if not match:
-        return {
-            "summary": "",
-            "key_insights": [],
-            "risks": [],
-            "recommendations": []
-        }
+def canonical(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {str(k): canonical(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [canonical(v) for v in obj]
+    return _round(obj)
+
+
+def insight_cache_key(clean_eda: Dict[str, Any]) -> str:
+    """
+    Canonical fingerprint of the digest (floats rounded, keys sorted),
+    versioned by the prompt text and the model.
+    """
+    return content_hash(
+        INSIGHT_PIPELINE_VERSION,
+        json.dumps([m.prompt.template for m in prompt.messages]),
+        Model.model_name,
+        Model.temperature,
+        json.dumps(canonical(clean_eda), sort_keys=True, separators=(",", ":"), default=str)
+    )
+
+
+INSIGHT_FIELDS = tuple(EMPTY_INSIGHTS)
 
+
+def insight_parser() -> JSONStreamParser:
+    return JSONStreamParser(fields=INSIGHT_FIELDS)
+
+
+def parser_insights(parser: JSONStreamParser) -> Dict[str, Any]:
+    return {field: parser.values.get(field, EMPTY_INSIGHTS[field]) for field in INSIGHT_FIELDS}
+
+
+def complete_insights(parser: JSONStreamParser) -> Optional[Dict[str, Any]]:
+    """
+    The parsed response when it is a whole InsightResponse, None when the
+    object was cut off, a field is missing or has the wrong type.
+    """
+    if not parser.done or any(field not in parser.values for field in INSIGHT_FIELDS):
+        return None
     try:
-        data = json.loads(match.group())
-    except Exception:
-        data = {}
+        return InsightResponse.model_validate(parser.values).model_dump()
+    except ValidationError:
+        return None
 
-    return {
-        "summary": data.get("summary", ""),
-        "key_insights": data.get("key_insights", []),
-        "risks": data.get("risks", []),
-        "recommendations": data.get("recommendations", [])
-    }
+
+def parse_insight_response(text: str) -> Dict[str, Any]:
+    """
+    Every complete field and list item of the response, a truncated
+    response keeps what came before the cut.
+    """
+    parser = insight_parser()
+    parser.feed(text or "")
+    return parser_insights(parser)
+
+
+def insight_agent(eda: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
+    clean_eda = prepare_insight_context(eda, metadata)
+    cache_key = insight_cache_key(clean_eda)
+    cached = INSIGHT_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    response = Model.invoke(insight_messages(clean_eda))
+    parser = insight_parser()
+    parser.feed(response.content or "")
+    complete = complete_insights(parser)
+    if complete is not None:
+        INSIGHT_CACHE.set(cache_key, complete)
+        return complete
+    return parser_insights(parser)
+
+
+async def ainsight_agent(
+    eda: Dict[str, Any],
+    metadata: Dict[str, Any],
+    timeout: float = INSIGHT_TIMEOUT_SECONDS,
+    on_item: Optional[Callable[[str, Any], None]] = None
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Streams the response through the incremental parser, on_item(field, value)
+    is called for the summary and for each list item as soon as it is complete.
+    On a timeout, or an error after some output, the report is built with the
+    insights parsed so far. Returns (insights, complete), only complete
+    responses are cached.
+    """
+    clean_eda = prepare_insight_context(eda, metadata)
+    cache_key = insight_cache_key(clean_eda)
+    cached = INSIGHT_CACHE.get(cache_key)
+    if cached is not None:
+        print("Insights served from cache ====> " + cache_key[:12])
+        if on_item is not None:
+            for field in INSIGHT_FIELDS:
+                value = cached[field]
+                values = value if isinstance(value, list) else [value] if value else []
+                for value in values:
+                    on_item(field, value)
+        return cached, True
+
+    parser = insight_parser()
+    messages = insight_messages(clean_eda)
+
+    async def consume():
+        async for chunk in Model.astream(messages):
+            for field, value in parser.feed(chunk.content):
+                if on_item is not None:
+                    on_item(field, value)
+
+    try:
+        await asyncio.wait_for(consume(), timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"Insight generation timed out after {timeout}s ====> kept {list(parser.values)}")
+    except Exception as e:
+        if not parser.values:
+            raise
+        print(f"Insight generation failed ====> {e}, kept {list(parser.values)}")
+    complete = complete_insights(parser)
+    if complete is not None:
+        INSIGHT_CACHE.set(cache_key, complete)
+        return complete, True
+    return parser_insights(parser), False
 
 
 if __name__ == "__main__":
@@ -0,0 +1,123 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Incremental parser for a streamed JSON object of strings and arrays.
+# Text is fed as it arrives, every top-level field value and every item of a
+# top-level array is returned the moment its closing character is seen, so
+# a response cut off by a timeout or an error keeps all its complete parts.
+# Anything before the first "{" (preamble, code fences) is skipped.
+
+
+WHITESPACE = " \t\r\n"
+
+
+class JSONStreamParser:
+
+    def __init__(self, fields: Optional[Tuple[str, ...]] = None):
+        # only these top-level fields are returned, all of them when None
+        self.fields = fields
+        self.values: Dict[str, Any] = {}
+        self.done = False
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[str] = None
+        self._expect_key = True
+        self._start: Optional[int] = None  # start of the key, value or item being read
+        self._in_array = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        (field, value) for each value completed by text; for an array field
+        value is one item.
+        """
+        completed: List[Tuple[str, Any]] = []
+        self._buf += text
+        while self._pos < len(self._buf) and not self.done:
+            self._step(self._buf[self._pos], completed)
+            self._pos += 1
+        self._trim()
+        return completed
+
+    def _step(self, ch: str, completed: List[Tuple[str, Any]]):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._depth == 1 or (self._depth == 2 and self._in_array):
+                    self._close(completed)
+            return
+
+        if self._depth == 0:
+            if ch == "{":
+                self._depth = 1
+            return
+
+        # a new key, value or item starts at its first significant character
+        if self._start is None and ch not in WHITESPACE + ",:]}":
+            if self._depth == 1 or (self._depth == 2 and self._in_array):
+                self._start = self._pos
+
+        if ch == '"':
+            self._in_string = True
+        elif ch in "{[":
+            if self._depth == 1 and ch == "[" and not self._expect_key:
+                self._in_array = True
+                self._start = None
+                if self.fields is None or self._key in self.fields:
+                    self.values[self._key] = []
+            self._depth += 1
+        elif ch in "}]":
+            if self._start is not None and (self._depth == 1 or (self._depth == 2 and self._in_array)):
+                # a number, true/false/null ends at the closing bracket
+                self._close(completed, end=self._pos)
+            self._depth -= 1
+            if self._depth == 0:
+                self.done = True
+            elif self._depth == 1 and self._in_array:
+                self._in_array = False
+            elif self._depth == 2 and self._in_array and self._start is not None:
+                # an object or array item of an array field is complete
+                self._close(completed, end=self._pos + 1)
+            elif self._depth == 1 and self._start is not None:
+                self._close(completed, end=self._pos + 1)
+        elif ch == ",":
+            if self._start is not None and (self._depth == 1 or (self._depth == 2 and self._in_array)):
+                self._close(completed, end=self._pos)
+            if self._depth == 1:
+                self._expect_key = True
+        elif ch == ":" and self._depth == 1:
+            self._expect_key = False
+
+    def _close(self, completed: List[Tuple[str, Any]], end: Optional[int] = None):
+        raw = self._buf[self._start:(self._pos + 1 if end is None else end)].strip()
+        self._start = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        if self._depth == 1 and self._expect_key:
+            self._key = value
+            return
+        if self.fields is not None and self._key not in self.fields:
+            return
+        if self._in_array:
+            self.values[self._key].append(value)
+        else:
+            self.values[self._key] = value
+        completed.append((self._key, value))
+
+    def _trim(self):
+        # keep only the unfinished value, the rest has been parsed
+        cut = self._pos if self._start is None else self._start
+        if cut:
+            self._buf = self._buf[cut:]
+            self._pos -= cut
+            if self._start is not None:
+                self._start -= cut
@@ -0,0 +1,175 @@
+import json
+import re
+import numpy as np
+import pandas as pd
+from typing import Any, List, Optional
+from pandas.api.types import is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype
+from Agents.Schemas import QuerySpec, QueryFilter
+
+
+# Executes a validated QuerySpec over the full dataframe.
+# The spec only names columns, operators and aggregation functions from a
+# fixed set, nothing from the question is ever evaluated as code, and every
+# step is a vectorized pandas operation.
+
+
+NUMERIC_ONLY = {"sum", "mean", "median", "std"}
+
+
+class QueryError(ValueError):
+    pass
+
+
+def parse_query_spec(text: str) -> Optional[QuerySpec]:
+    """
+    First JSON object in the model output, None if there is none or it does
+    not match the schema.
+    """
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not match:
+        return None
+    try:
+        return QuerySpec.model_validate(json.loads(match.group()))
+    except Exception:
+        return None
+
+
+def output_name(func: str, column: Optional[str]) -> str:
+    return func if column is None else f"{func}_{column}"
+
+
+def _check_column(df: pd.DataFrame, column: Optional[str]):
+    if column not in df.columns:
+        raise QueryError(f"Unknown column: {column}")
+
+
+def _coerce(series: pd.Series, value: Any) -> Any:
+    if isinstance(value, list):
+        return [_coerce(series, v) for v in value]
+    if value is None:
+        return value
+    try:
+        if is_bool_dtype(series):
+            return value if isinstance(value, bool) else str(value).strip().lower() in ("true", "1", "yes", "y")
+        if is_numeric_dtype(series):
+            return float(value)
+        if is_datetime64_any_dtype(series):
+            return pd.Timestamp(value)
+    except (TypeError, ValueError):
+        raise QueryError(f"Value {value!r} does not fit column {series.name}")
+    return str(value)
+
+
+def _filter_mask(df: pd.DataFrame, f: QueryFilter) -> pd.Series:
+    _check_column(df, f.column)
+    series = df[f.column]
+    if f.op == "is_null":
+        return series.isna()
+    if f.op == "not_null":
+        return series.notna()
+    if f.op == "contains":
+        return series.astype(str).str.contains(str(f.value), case=False, regex=False, na=False)
+
+    if f.op in ("in", "not_in"):
+        values = f.value if isinstance(f.value, list) else [f.value]
+        values = _coerce(series, values)
+        if series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype):
+            # text matching is case-insensitive like the rest of the chat
+            mask = series.astype(str).str.lower().isin([str(v).lower() for v in values])
+        else:
+            mask = series.isin(values)
+        return ~mask if f.op == "not_in" else mask
+
+    value = _coerce(series, f.value)
+    if value is None:
+        raise QueryError(f"Filter on {f.column} needs a value")
+    if isinstance(value, str):
+        series = series.astype(str).str.lower()
+        value = value.lower()
+        if f.op not in ("==", "!="):
+            raise QueryError(f"Operator {f.op} needs a numeric or date column")
+    ops = {
+        "==": series.__eq__, "!=": series.__ne__,
+        ">": series.__gt__, ">=": series.__ge__,
+        "<": series.__lt__, "<=": series.__le__
+    }
+    return ops[f.op](value).fillna(False).astype(bool)
+
+
+def validate_query(df: pd.DataFrame, spec: QuerySpec):
+    for f in spec.filters:
+        _check_column(df, f.column)
+    for col in spec.group_by:
+        _check_column(df, col)
+    if spec.mode == "aggregate" and not spec.aggregations:
+        raise QueryError("Aggregate query without aggregations")
+    for agg in spec.aggregations:
+        if agg.column is None:
+            if agg.func != "count":
+                raise QueryError(f"{agg.func} needs a column")
+            continue
+        _check_column(df, agg.column)
+        if agg.func in NUMERIC_ONLY and not is_numeric_dtype(df[agg.column]):
+            raise QueryError(f"{agg.func} needs a numeric column, {agg.column} is not")
+
+
+def _aggregate(frame: pd.DataFrame, spec: QuerySpec) -> pd.DataFrame:
+    named = {}
+    for agg in spec.aggregations:
+        if agg.column is None:
+            named[output_name(agg.func, None)] = (frame.columns[0], "size")
+        else:
+            named[output_name(agg.func, agg.column)] = (agg.column, agg.func)
+
+    if spec.group_by:
+        return frame.groupby(spec.group_by, observed=True, dropna=False).agg(**named).reset_index()
+    return pd.DataFrame({
+        name: [len(frame) if func == "size" else frame[col].agg(func)]
+        for name, (col, func) in named.items()
+    })
+
+
+def execute_query(df: pd.DataFrame, spec: QuerySpec) -> pd.DataFrame:
+    """
+    Result of the spec over all rows, at most spec.limit rows.
+    """
+    return run_query(df, spec).head(spec.limit)
+
+
+def run_query(df: pd.DataFrame, spec: QuerySpec) -> pd.DataFrame:
+    """
+    Every row or group of the result, before the limit is applied.
+    """
+    validate_query(df, spec)
+
+    mask = np.ones(len(df), dtype=bool)
+    for f in spec.filters:
+        mask &= _filter_mask(df, f).to_numpy()
+    frame = df if mask.all() else df[mask]
+
+    if spec.mode == "aggregate":
+        result = _aggregate(frame, spec)
+    else:
+        result = frame
+
+    if spec.sort_by:
+        if spec.sort_by not in result.columns:
+            raise QueryError(f"Cannot sort by {spec.sort_by}")
+        result = result.sort_values(spec.sort_by, ascending=not spec.descending, kind="stable")
+    return result
+
+
+def describe_query(spec: QuerySpec) -> str:
+    parts: List[str] = []
+    if spec.filters:
+        parts.append("where " + " and ".join(
+            f"{f.column} {f.op} {f.value}" if f.value is not None else f"{f.column} {f.op}"
+            for f in spec.filters
+        ))
+    if spec.group_by:
+        parts.append("grouped by " + ", ".join(spec.group_by))
+    if spec.aggregations:
+        parts.append("computing " + ", ".join(output_name(a.func, a.column) for a in spec.aggregations))
+    if spec.sort_by:
+        parts.append(f"sorted by {spec.sort_by} {'desc' if spec.descending else 'asc'}")
+    return "; ".join(parts) or "all rows"
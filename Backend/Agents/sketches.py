@@ -0,0 +1,236 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Tuple
+
+
+# Mergeable sketches for approximate statistics on very large datasets.
+# Every sketch can be updated chunk by chunk and merged with another sketch
+# of the same kind, so they work inside the streaming ingest as well.
+#
+# QuantileSketch  -> medians / quartiles / IQR bounds   (rank error bound)
+# DistinctCounter -> cardinality (HyperLogLog)           (relative std error)
+# HeavyHitters    -> top-k categories (Misra-Gries)      (absolute count error)
+
+
+APPROX_STATS_MIN_ROWS = int(os.getenv("APPROX_STATS_MIN_ROWS", "0"))
+# rows per chunk when an approximate statistic scans a whole frame
+APPROX_CHUNK_ROWS = 1_000_000
+QUANTILE_SKETCH_K = 2048
+DISTINCT_PRECISION = 12
+HEAVY_HITTERS_K = 1024
+
+
+def use_approximate(rows: int) -> bool:
+    """
+    Approximate mode is opt-in: APPROX_STATS_MIN_ROWS=0 keeps everything exact.
+    """
+    return APPROX_STATS_MIN_ROWS > 0 and rows >= APPROX_STATS_MIN_ROWS
+
+
+class QuantileSketch:
+    """
+    Hierarchy of compactors (KLL style). A full level is sorted and every
+    other item is promoted with twice the weight. Each compaction at level h
+    moves any rank by at most 2**h, which gives the deterministic bound
+    reported by rank_error().
+    """
+
+    def __init__(self, k: int = QUANTILE_SKETCH_K, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self.compactions: List[int] = [0]
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values) -> "QuantileSketch":
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for h, items in enumerate(other.levels):
+            self._ensure_level(h)
+            self.levels[h] = np.concatenate([self.levels[h], items])
+            self.compactions[h] += other.compactions[h]
+        self._compress()
+        return self
+
+    def _ensure_level(self, h: int):
+        while len(self.levels) <= h:
+            self.levels.append(np.empty(0))
+            self.compactions.append(0)
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) > self.k:
+                items = np.sort(items)
+                leftover = items[len(items) - len(items) % 2:]
+                offset = int(self._rng.integers(2))
+                promoted = items[offset:len(items) - len(leftover):2]
+                self.levels[h] = leftover
+                self.compactions[h] += 1
+                self._ensure_level(h + 1)
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def rank_error(self) -> float:
+        """
+        Upper bound on |estimated rank - true rank| / n for any quantile.
+        """
+        if self.n == 0:
+            return 0.0
+        return float(sum(c * 2 ** h for h, c in enumerate(self.compactions)) / self.n)
+
+    def quantiles(self, qs) -> np.ndarray:
+        qs = np.asarray(qs, dtype="float64")
+        if self.n == 0:
+            return np.full(qs.shape, np.nan)
+        if sum(self.compactions) == 0:
+            return np.quantile(self.levels[0], qs)
+
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(l), 2.0 ** h) for h, l in enumerate(self.levels)])
+        order = np.argsort(items)
+        items, cumulative = items[order], np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side="left")
+        result = items[np.clip(positions, 0, len(items) - 1)]
+        result = np.where(qs <= 0, self.min, result)
+        return np.where(qs >= 1, self.max, result)
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+
+def _leading_zeros(words: np.ndarray) -> np.ndarray:
+    count = np.zeros(len(words), dtype="uint8")
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = words < (np.uint64(1) << np.uint64(64 - shift))
+        count += empty.astype("uint8") * np.uint8(shift)
+        words = np.where(empty, words << np.uint64(shift), words)
+    return count
+
+
+class DistinctCounter:
+    """
+    HyperLogLog over pandas' 64-bit value hashes.
+    """
+
+    def __init__(self, precision: int = DISTINCT_PRECISION):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype="uint8")
+
+    def update(self, series: pd.Series) -> "DistinctCounter":
+        series = series.dropna()
+        if series.empty:
+            return self
+        hashes = pd.util.hash_pandas_object(series, index=False).to_numpy(dtype="uint64")
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype("int64")
+        words = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+        np.maximum.at(self.registers, index, _leading_zeros(words) + 1)
+        return self
+
+    def merge(self, other: "DistinctCounter") -> "DistinctCounter":
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def relative_error(self) -> float:
+        return 1.04 / np.sqrt(self.m)
+
+    def estimate(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m ** 2 / np.sum(np.exp2(-self.registers.astype("float64")))
+        zeros = int((self.registers == 0).sum())
+        if raw <= 2.5 * self.m and zeros > 0:
+            raw = self.m * np.log(self.m / zeros)
+        return int(round(raw))
+
+
+class HeavyHitters:
+    """
+    Misra-Gries summary with k counters. Estimates never exceed the true
+    count and fall short by at most error_bound() <= n / (k + 1).
+    """
+
+    def __init__(self, k: int = HEAVY_HITTERS_K):
+        self.k = k
+        self.n = 0
+        self.counts = pd.Series(dtype="float64")
+
+    def update(self, series: pd.Series) -> "HeavyHitters":
+        counts = series.value_counts()
+        self.n += int(counts.sum())
+        self._add(counts)
+        return self
+
+    def merge(self, other: "HeavyHitters") -> "HeavyHitters":
+        self.n += other.n
+        self._add(other.counts)
+        return self
+
+    def _add(self, counts: pd.Series):
+        merged = self.counts.add(counts.astype("float64"), fill_value=0)
+        if len(merged) > self.k:
+            kth = merged.nlargest(self.k + 1).iloc[-1]
+            merged = merged - kth
+            merged = merged[merged > 0]
+        self.counts = merged
+
+    def error_bound(self) -> float:
+        return float(max(self.n - self.counts.sum(), 0) / (self.k + 1))
+
+    def top(self, k: int) -> List[Tuple[Any, int]]:
+        """
+        Highest estimates first, ties broken by value for a stable order.
+        """
+        if self.counts.empty:
+            return []
+        frame = pd.DataFrame({
+            "value": self.counts.index.astype(str),
+            "key": self.counts.index,
+            "count": self.counts.to_numpy()
+        })
+        frame = frame.sort_values(["count", "value"], ascending=[False, True]).head(k)
+        return [(key, int(count)) for key, count in zip(frame["key"], frame["count"])]
+
+    def mode(self):
+        top = self.top(1)
+        return top[0][0] if top else None
+
+
+def sketch_categorical(series: pd.Series, top_k: int, chunk_rows: int) -> Dict[str, Any]:
+    """
+    Top-k categories and cardinality of one column, built chunk by chunk.
+    """
+    hitters = HeavyHitters(max(HEAVY_HITTERS_K, top_k))
+    distinct = DistinctCounter()
+    for start in range(0, len(series), chunk_rows):
+        chunk = series.iloc[start:start + chunk_rows]
+        hitters.update(chunk)
+        distinct.update(chunk)
+
+    top = hitters.top(top_k)
+    return {
+        "top": top,
+        "count": hitters.n,
+        "tail_count_at_most": int(hitters.n - sum(c for _, c in top)),
+        "count_error_bound": hitters.error_bound(),
+        "distinct_estimate": distinct.estimate(),
+        "distinct_relative_error": round(float(distinct.relative_error()), 4)
+    }
@@ -0,0 +1,335 @@
+import os
+import uuid
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Iterator, List, Optional
+from pandas.api.types import is_integer_dtype
+from Agents.data_cleaning import normalize_column_name
+from Agents.type_inference import infer_schema, convert_column
+from Agents.sketches import QuantileSketch, HeavyHitters
+from Agents.dedup import RowDeduplicator, row_hashes, take_rows
+from Agents.compaction import CATEGORY_MAX_RATIO, apply_compaction, float32_exact, integer_dtype_for
+from Core.columnar import ColumnarWriter, save_columnar_metadata
+
+
+# Chunked version of Preprocess_data for files that do not fit in memory.
+# Pass 1: infer schema from the first rows, validate it on every chunk and
+#         collect mergeable per-column aggregates (nulls, median, modes)
+# Pass 2: re-read chunks, apply schema + fills, drop duplicates, append each
+#         chunk to the columnar file that downstream nodes memory-map
+
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "100000"))
+STREAMING_THRESHOLD_MB = int(os.getenv("STREAMING_THRESHOLD_MB", "256"))
+SCHEMA_SAMPLE_ROWS = int(os.getenv("SCHEMA_SAMPLE_ROWS", "10000"))
+MODE_TRACKED_VALUES = 1024
+MAX_SCHEMA_PASSES = 3
+
+
+def should_stream(file_path: str) -> bool:
+    return os.path.getsize(file_path) >= STREAMING_THRESHOLD_MB * 1024 * 1024
+
+
+def column_name_map(file_path: str) -> Dict[str, str]:
+    """
+    Raw header name -> normalized column name
+    """
+    header = pd.read_csv(file_path, nrows=0)
+    raw = list(header.columns)
+    return dict(zip(raw, normalize_column_name(header).columns))
+
+
+def infer_stream_schema(file_path: str, sample_rows: int = SCHEMA_SAMPLE_ROWS) -> Dict[str, Dict[str, Any]]:
+    sample = normalize_column_name(pd.read_csv(file_path, nrows=sample_rows))
+    return infer_schema(sample)
+
+
+def read_chunks(
+    file_path: str,
+    schema: Dict[str, Dict[str, Any]],
+    chunksize: int = INGEST_CHUNK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """
+    Text-like columns are read as strings so every chunk sees the same values
+    the full-file parser would have produced.
+    """
+    names = column_name_map(file_path)
+    dtype = {
+        raw: str for raw, col in names.items()
+        if col in schema and schema[col]["kind"] in ("categorical", "datetime")
+    }
+    for chunk in pd.read_csv(file_path, chunksize=chunksize, dtype=dtype):
+        yield normalize_column_name(chunk)
+
+
+def apply_stream_schema(chunk: pd.DataFrame, schema: Dict[str, Dict[str, Any]]) -> List[str]:
+    """
+    Convert a chunk in place with the cached per-column types and datetime
+    formats. Returns columns holding values the schema cannot represent
+    (they must be demoted to categorical).
+    """
+    violations = []
+    for col, spec in schema.items():
+        if spec["kind"] not in ("numeric", "datetime"):
+            continue
+        converted, lossless = convert_column(chunk[col], spec)
+        if not lossless:
+            violations.append(col)
+        chunk[col] = converted
+    return violations
+
+
+class RunningColumnStats:
+    """
+    Mergeable aggregates for one column.
+    Median comes from a quantile sketch, modes from a heavy-hitters summary.
+    The sketch compacts once it holds more than QUANTILE_SKETCH_K values,
+    so already within the first chunk; beyond that the median is approximate
+    within quantiles.rank_error().
+    """
+
+    def __init__(self, kind: str, seed: int = 0):
+        self.kind = kind
+        self.count = 0
+        self.nulls = 0
+        self.integral = True
+        self.float32 = True
+        self.quantiles = QuantileSketch(seed=seed)
+        self.hitters = HeavyHitters(MODE_TRACKED_VALUES)
+
+    def update(self, series: pd.Series):
+        nulls = int(series.isna().sum())
+        self.nulls += nulls
+        self.count += len(series) - nulls
+
+        if self.kind == "numeric":
+            self.integral = self.integral and is_integer_dtype(series)
+            values = series.to_numpy(dtype="float64", na_value=np.nan)
+            self.float32 = self.float32 and float32_exact(values)
+            self.quantiles.update(values)
+        elif self.kind in ("categorical", "bool"):
+            self.hitters.update(series)
+
+    def merge(self, other: "RunningColumnStats"):
+        self.count += other.count
+        self.nulls += other.nulls
+        self.integral = self.integral and other.integral
+        self.float32 = self.float32 and other.float32
+        self.quantiles.merge(other.quantiles)
+        self.hitters.merge(other.hitters)
+
+    def mode(self):
+        return self.hitters.mode()
+
+    def fill_value(self):
+        """
+        Same rules as handle_missing_values: median for numeric,
+        mode for categorical/bool, datetimes are left as NaT.
+        """
+        if self.nulls == 0:
+            return None
+        if self.kind == "numeric":
+            return self.quantiles.quantile(0.5) if self.quantiles.n else None
+        if self.kind == "categorical":
+            mode = self.mode()
+            return "Unknown" if mode is None else mode
+        if self.kind == "bool":
+            mode = self.mode()
+            return False if mode is None else mode
+        return None
+
+
+def compaction_plan(stats: Dict[str, RunningColumnStats], fills: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pass 1 counterpart of compact_dataframe: the dtype of every column that
+    can be narrowed, decided from the whole file before any chunk is written.
+    Integers use the exact min/max, floats go to float32 only if every value
+    and the fill value round-trip, strings become categoricals when all their
+    distinct values were tracked and they are repetitive enough.
+    """
+    plan: Dict[str, Any] = {}
+    for col, s in stats.items():
+        if s.kind == "numeric" and s.quantiles.n:
+            if s.integral:
+                dtype = integer_dtype_for(s.quantiles.min, s.quantiles.max)
+                if dtype != "int64":
+                    plan[col] = dtype
+            elif s.float32 and (col not in fills or float32_exact([fills[col]])):
+                plan[col] = "float32"
+        elif s.kind == "categorical" and s.count and s.hitters.error_bound() == 0:
+            values = set(map(str, s.hitters.counts.index))
+            if col in fills:
+                values.add(str(fills[col]))
+            if len(values) / (s.count + s.nulls) <= CATEGORY_MAX_RATIO:
+                plan[col] = pd.CategoricalDtype(sorted(values))
+    return plan
+
+
+def collect_stream_stats(
+    file_path: str,
+    chunksize: int = INGEST_CHUNK_SIZE
+):
+    """
+    Pass 1. Re-runs with a demoted schema when a later chunk contains values
+    the sampled schema cannot hold. Only the first occurrence of each row is
+    counted, Preprocess_data also drops duplicates before computing fills.
+    """
+    schema = infer_stream_schema(file_path)
+    for _ in range(MAX_SCHEMA_PASSES):
+        stats = {col: RunningColumnStats(spec["kind"]) for col, spec in schema.items()}
+        dedup = RowDeduplicator()
+        # hashed as float64 so chunks agree whether or not a column had gaps there
+        numeric = {col: "float64" for col, spec in schema.items() if spec["kind"] == "numeric"}
+        demoted = set()
+        for chunk in read_chunks(file_path, schema, chunksize):
+            demoted.update(apply_stream_schema(chunk, schema))
+            if demoted:
+                break
+            keep = dedup.keep_mask(row_hashes(chunk.astype(numeric) if numeric else chunk))
+            chunk = take_rows(chunk, keep)
+            for col in schema:
+                stats[col].update(chunk[col])
+        if not demoted:
+            return schema, stats
+        print(f"Schema demoted to categorical for: {sorted(demoted)}")
+        for col in demoted:
+            schema[col] = {"kind": "categorical", "format": None, "source": "fallback"}
+    raise ValueError("Could not settle a stable schema for streaming ingestion")
+
+
+def iter_clean_chunks(
+    file_path: str,
+    schema: Dict[str, Dict[str, Any]],
+    fills: Dict[str, Any],
+    chunksize: int = INGEST_CHUNK_SIZE,
+    float_columns: Optional[List[str]] = None,
+    dedup: Optional[RowDeduplicator] = None,
+    plan: Optional[Dict[str, Any]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Pass 2. Duplicates are checked after imputation so rows that only became
+    identical once their gaps were filled are removed as well.
+    The deduplicator keeps only row hashes, its duplicates count covers
+    every chunk. Numeric columns that are not integral in every chunk are emitted as
+    float64 so all chunks share one dtype, then the compaction plan is applied.
+    """
+    if dedup is None:
+        dedup = RowDeduplicator()
+    for chunk in read_chunks(file_path, schema, chunksize):
+        apply_stream_schema(chunk, schema)
+        if fills:
+            chunk.fillna(value=fills, inplace=True)
+        if float_columns:
+            chunk[float_columns] = chunk[float_columns].astype("float64")
+
+        chunk = dedup.filter(chunk)
+        yield apply_compaction(chunk, plan) if plan else chunk
+
+
+def metadata_from_stats(
+    columns: List[str],
+    dtypes: Dict[str, Any],
+    rows: int,
+    missing: Dict[str, int],
+    duplicates_removed: int = 0
+) -> Dict[str, Any]:
+    """
+    Same shape as generate_metadata, built without touching the full frame.
+    """
+    frame = pd.DataFrame({col: pd.Series(dtype=dtypes[col]) for col in columns})
+    return {
+        "rows": int(rows),
+        "duplicates_removed": int(duplicates_removed),
+        "columns": list(columns),
+        "numeric_columns": frame.select_dtypes(include="number").columns.tolist(),
+        "categorical_columns": frame.select_dtypes(include=["object", "category"]).columns.tolist(),
+        "datetime_columns": frame.select_dtypes(include="datetime").columns.tolist(),
+        "missing_values": {col: int(missing.get(col, 0)) for col in columns}
+    }
+
+
+def Preprocess_data_streaming(
+    file_path: str,
+    chunksize: int = INGEST_CHUNK_SIZE,
+    file_id: Optional[str] = None
+):
+    """
+    Streaming counterpart of Preprocess_data.
+    Every cleaned chunk goes straight to the columnar file of file_id (a
+    temporary id when none is given), no full frame is ever built. Returns
+    the file id in place of the dataframe, callers memory-map it with
+    load_columnar.
+    """
+    try:
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File not found: {file_path}")
+
+        schema, stats = collect_stream_stats(file_path, chunksize)
+        fills = {
+            col: value for col, s in stats.items()
+            if (value := s.fill_value()) is not None
+        }
+        float_columns = [
+            col for col, s in stats.items()
+            if s.kind == "numeric" and not s.integral
+        ]
+
+        plan = compaction_plan(stats, fills)
+
+        file_id = file_id or f"stream_{uuid.uuid4()}"
+        writer = ColumnarWriter(file_id)
+        rows = 0
+        missing: Dict[str, int] = {}
+        columns: List[str] = list(schema)
+        dtypes: Dict[str, Any] = {}
+        dedup = RowDeduplicator()
+        bytes_after = 0
+        for chunk in iter_clean_chunks(file_path, schema, fills, chunksize, float_columns, dedup, plan):
+            rows += len(chunk)
+            bytes_after += int(chunk.memory_usage(deep=True).sum())
+            for col, val in chunk.isnull().sum().items():
+                missing[col] = missing.get(col, 0) + int(val)
+            dtypes = chunk.dtypes.to_dict()
+            writer(chunk)
+        if not dtypes:
+            dtypes = {col: "object" for col in columns}
+            writer(pd.DataFrame({col: pd.Series(dtype="object") for col in columns}))
+        writer.close()
+
+        print(f"Data streamed successfully ====> Length: {rows}")
+        metadata = metadata_from_stats(columns, dtypes, rows, missing, dedup.duplicates)
+        # footprint of the written chunks, they are never all in memory together
+        metadata["memory"] = {
+            "bytes_after": bytes_after,
+            "converted_columns": {col: str(dtype) for col, dtype in plan.items()}
+        }
+        save_columnar_metadata(file_id, metadata)
+        return {
+            "dataframe": None,
+            "file_id": file_id,
+            "metadata": metadata,
+            "status": "success",
+            "message": "Data preprocessing completed successfully"
+        }
+
+    except Exception as e:
+        return {
+            "dataframe": None,
+            "file_id": None,
+            "metadata": {},
+            "status": "error",
+            "message": f"Error during preprocessing: {str(e)}"
+        }
+
+
+if __name__ == "__main__":
+    from pprint import pprint
+    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    filepath = os.path.join(
+        BASE_DIR,
+        "Data",
+        "CVD Dataset.csv"
+    )
+    response = Preprocess_data_streaming(file_path=filepath, chunksize=500)
+    print(response['file_id'])
+    pprint(response['metadata'])
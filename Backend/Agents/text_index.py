@@ -0,0 +1,165 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+
+
+# Token inverted index over the text and categorical columns of a dataset.
+# Built once per chat session: every distinct cell value is tokenized once,
+# the posting list of a token is the sorted row positions containing it.
+# Rows are ranked against a question with BM25 using the precomputed
+# document frequencies and row lengths, instead of scanning the columns.
+# Every text column is indexed, free text, names and ids included. The size
+# is bounded per token instead: stopwords are never indexed and a token whose
+# posting list in a column would exceed INDEX_MAX_DOC_SHARE of the rows is
+# dropped there, such a token barely moves a BM25 score anyway.
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it many me much "
+    "of on or show tell than that the their there these this to was what when "
+    "where which who why with".split()
+)
+BM25_K1 = 1.2
+BM25_B = 0.75
+# rows scored per question, keeps the cost flat on large tables
+RANK_CANDIDATE_ROWS = int(os.getenv("RANK_CANDIDATE_ROWS", "20000"))
+# longest posting list kept per token and column, as a share of the rows
+INDEX_MAX_DOC_SHARE = float(os.getenv("INDEX_MAX_DOC_SHARE", "0.5"))
+# posting lists up to this many rows are always kept, small tables are indexed in full
+INDEX_MIN_POSTING_ROWS = int(os.getenv("INDEX_MIN_POSTING_ROWS", "1000"))
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English and CSV text
+    return len(text) // 4 + 1
+
+
+def text_columns(df: pd.DataFrame) -> List[str]:
+    return [
+        col for col in df.columns
+        if df[col].dtype == object or isinstance(df[col].dtype, pd.CategoricalDtype)
+    ]
+
+
+def _rows_per_code(codes: np.ndarray, n_codes: int) -> List[np.ndarray]:
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(n_codes + 1))
+    return [order[bounds[i]:bounds[i + 1]] for i in range(n_codes)]
+
+
+def _contains(posting: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    positions = np.searchsorted(posting, rows)
+    positions[positions == len(posting)] = 0
+    return posting[positions] == rows
+
+
+class InvertedIndex:
+    """
+    A row is the document, its text cells are the fields. Term frequency is
+    the number of cells of the row containing the token.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.rows = len(df)
+        self.columns = text_columns(df)
+        self.max_posting = max(INDEX_MIN_POSTING_ROWS, int(INDEX_MAX_DOC_SHARE * self.rows))
+        self.dropped_tokens = 0
+        # token -> column -> sorted row positions
+        self.postings: Dict[str, Dict[str, np.ndarray]] = {}
+        self.lengths = np.zeros(self.rows, dtype="int32")
+        for col in self.columns:
+            self._index_column(col, df[col])
+
+        self.avg_length = float(self.lengths.mean()) if self.rows else 0.0
+        self.doc_freq: Dict[str, int] = {
+            token: len(self.token_rows(token)) for token in self.postings
+        }
+
+    def _index_column(self, col: str, series: pd.Series):
+        codes, uniques = pd.factorize(series, sort=False)
+        if len(uniques) == 0:
+            return
+        rows_per_code = _rows_per_code(codes, len(uniques))
+        token_codes: Dict[str, List[int]] = {}
+        value_lengths = np.zeros(len(uniques) + 1, dtype="int32")
+        for code, value in enumerate(uniques):
+            tokens = tokenize(value)
+            value_lengths[code] = len(tokens)
+            for token in set(tokens) - STOPWORDS:
+                token_codes.setdefault(token, []).append(code)
+        # code -1 (missing) picks the trailing 0
+        self.lengths += value_lengths[codes]
+
+        for token, code_list in token_codes.items():
+            if sum(len(rows_per_code[c]) for c in code_list) > self.max_posting:
+                self.dropped_tokens += 1
+                continue
+            if len(code_list) == 1:
+                rows = rows_per_code[code_list[0]]
+            else:
+                rows = np.sort(np.concatenate([rows_per_code[c] for c in code_list]))
+            self.postings.setdefault(token, {})[col] = rows
+
+    @property
+    def nbytes(self) -> int:
+        postings = sum(rows.nbytes for cols in self.postings.values() for rows in cols.values())
+        return postings + self.lengths.nbytes
+
+    def token_rows(self, token: str) -> np.ndarray:
+        columns = self.postings.get(token)
+        if not columns:
+            return np.empty(0, dtype="int64")
+        if len(columns) == 1:
+            return next(iter(columns.values()))
+        return np.unique(np.concatenate(list(columns.values())))
+
+    def idf(self, token: str) -> float:
+        df = self.doc_freq[token]
+        return float(np.log(1 + (self.rows - df + 0.5) / (df + 0.5)))
+
+    def query_tokens(self, question: str) -> List[str]:
+        """
+        Indexed, non-stopword tokens of the question, rarest first. A token
+        present in every row carries no information and is left out.
+        """
+        tokens = [
+            t for t in dict.fromkeys(tokenize(question))
+            if t in self.postings and t not in STOPWORDS and self.doc_freq[t] < self.rows
+        ]
+        return sorted(tokens, key=lambda t: (self.doc_freq[t], t))
+
+    def _candidates(self, tokens: List[str]) -> np.ndarray:
+        # rows holding any token rare enough to enumerate, otherwise the
+        # first rows of the rarest token; frequent tokens only add score
+        rare = [t for t in tokens if self.doc_freq[t] <= RANK_CANDIDATE_ROWS]
+        if not rare:
+            return self.token_rows(tokens[0])[:RANK_CANDIDATE_ROWS]
+        return np.unique(np.concatenate([self.token_rows(t) for t in rare]))
+
+    def rank(self, question: str, limit: int = 8) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top rows by BM25 score, ties broken by row position.
+        Returns (rows, scores), both empty when no query token is informative.
+        """
+        tokens = self.query_tokens(question)
+        if not tokens:
+            return np.empty(0, dtype="int64"), np.empty(0)
+
+        rows = self._candidates(tokens)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[rows] / max(self.avg_length, 1e-9))
+        scores = np.zeros(len(rows))
+        for token in tokens:
+            tf = np.zeros(len(rows))
+            for posting in self.postings[token].values():
+                tf += _contains(posting, rows)
+            scores += self.idf(token) * tf * (BM25_K1 + 1) / (tf + norm)
+
+        order = np.lexsort((rows, -scores))[:limit]
+        return rows[order], scores[order]
@@ -0,0 +1,156 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Optional, Tuple
+from pandas.api.types import (
+    is_bool_dtype,
+    is_datetime64_any_dtype,
+    is_numeric_dtype,
+)
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:
+    guess_datetime_format = None
+
+
+# Decide every column's type from a bounded sample, then convert the whole
+# frame once with the chosen dtypes (and one cached format per datetime column).
+
+
+TYPE_SAMPLE_SIZE = int(os.getenv("TYPE_SAMPLE_SIZE", "2000"))
+
+DATETIME_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y/%m/%d",
+    "%d/%m/%Y",
+    "%m/%d/%Y",
+    "%d-%m-%Y",
+    "%m-%d-%Y",
+    "%d/%m/%Y %H:%M",
+    "%m/%d/%Y %H:%M",
+    "%Y%m%d",
+]
+
+
+def column_kind(series: pd.Series) -> str:
+    if is_bool_dtype(series):
+        return "bool"
+    if is_numeric_dtype(series):
+        return "numeric"
+    if is_datetime64_any_dtype(series):
+        return "datetime"
+    return "categorical"
+
+
+def sample_column(series: pd.Series, sample_size: int = TYPE_SAMPLE_SIZE) -> pd.Series:
+    """
+    Evenly spaced rows so the sample covers the whole column, nulls dropped.
+    """
+    if len(series) > sample_size:
+        positions = np.linspace(0, len(series) - 1, sample_size).astype(int)
+        series = series.iloc[positions]
+    return series.dropna()
+
+
+def detect_datetime_format(sample: pd.Series) -> Optional[str]:
+    """
+    First format that parses every sampled value, or None.
+    """
+    values = sample.astype(str)
+    candidates = []
+    if guess_datetime_format is not None:
+        guessed = guess_datetime_format(values.iloc[0])
+        if guessed:
+            candidates.append(guessed)
+    candidates += [fmt for fmt in DATETIME_FORMATS if fmt not in candidates]
+
+    for fmt in candidates:
+        parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+        if parsed.notna().all():
+            return fmt
+    return None
+
+
+def infer_column_type(series: pd.Series, sample_size: int = TYPE_SAMPLE_SIZE) -> Dict[str, Any]:
+    kind = column_kind(series)
+    if kind != "categorical":
+        return {"kind": kind, "format": None, "source": "parser"}
+
+    sample = sample_column(series, sample_size)
+    if sample.empty:
+        return {"kind": "categorical", "format": None, "source": "parser"}
+
+    if pd.to_numeric(sample, errors="coerce").notna().all():
+        return {"kind": "numeric", "format": None, "source": "sample"}
+
+    if sample.map(type).eq(str).all():
+        fmt = detect_datetime_format(sample)
+        if fmt is not None:
+            return {"kind": "datetime", "format": fmt, "source": "sample"}
+
+    return {"kind": "categorical", "format": None, "source": "sample"}
+
+
+def infer_schema(df: pd.DataFrame, sample_size: int = TYPE_SAMPLE_SIZE) -> Dict[str, Dict[str, Any]]:
+    return {col: infer_column_type(df[col], sample_size) for col in df.columns}
+
+
+def convert_column(series: pd.Series, spec: Dict[str, Any]) -> Tuple[pd.Series, bool]:
+    """
+    Convert one column to the kind chosen for it.
+    Returns the converted series and whether every value survived conversion.
+    """
+    kind = spec["kind"]
+    if kind == "numeric" and not is_numeric_dtype(series):
+        converted = pd.to_numeric(series, errors="coerce")
+    elif kind == "datetime" and not is_datetime64_any_dtype(series):
+        converted = pd.to_datetime(series, format=spec.get("format"), errors="coerce")
+    else:
+        return series, True
+
+    lossless = not (converted.isna() & series.notna()).any()
+    return converted, lossless
+
+
+def apply_schema(df: pd.DataFrame, schema: Dict[str, Dict[str, Any]]) -> pd.DataFrame:
+    """
+    One conversion per column that needs it. A column whose unsampled rows do
+    not fit the chosen type is kept as-is, like the old errors="ignore" path.
+    """
+    converted = {}
+    for col, spec in schema.items():
+        if spec["source"] == "parser" or spec["kind"] == "categorical":
+            continue
+        values, lossless = convert_column(df[col], spec)
+        if lossless:
+            converted[col] = values
+        else:
+            spec.update({"kind": "categorical", "format": None, "source": "fallback"})
+
+    for col, values in converted.items():
+        df[col] = values
+    return df
+
+
+def infer_types(df: pd.DataFrame, sample_size: int = TYPE_SAMPLE_SIZE) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    start = time.perf_counter()
+    schema = infer_schema(df, sample_size)
+    df = apply_schema(df, schema)
+    report = {
+        "sample_size": int(sample_size),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        "columns": {
+            col: {
+                "kind": spec["kind"],
+                "dtype": str(df[col].dtype),
+                "format": spec["format"],
+                "source": spec["source"]
+            }
+            for col, spec in schema.items()
+        }
+    }
+    return df, report
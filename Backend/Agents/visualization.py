@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 from typing import Dict, Any, List
+from Agents.sketches import APPROX_CHUNK_ROWS, sketch_categorical, use_approximate
 
 def clean_for_json(obj):
     if isinstance(obj, list):
@@ -25,14 +26,21 @@ def make_histogram(df: pd.DataFrame, column: str) -> Dict[str, Any]:
         "title": f"Distribution of {column}"
     }
 
-def make_bar_chart(df: pd.DataFrame, column: str, top_k: int = 15) -> Dict[str, Any]:
-    value_counts = df[column].value_counts().head(top_k)
+def make_bar_chart(df: pd.DataFrame, column: str, top_k: int = 15, approximate: bool = False) -> Dict[str, Any]:
+    if approximate:
+        top = sketch_categorical(df[column], top_k, APPROX_CHUNK_ROWS)["top"]
+        x = [str(k) for k, _ in top]
+        y = [int(v) for _, v in top]
+    else:
+        value_counts = df[column].value_counts().head(top_k)
+        x = value_counts.index.astype(str).tolist()
+        y = [int(v) for v in value_counts.values]
     return {
         "id": f"bar_{column}",
         "type": "bar",
         "column": column,
-        "x": value_counts.index.astype(str).tolist(),
-        "y": [int(v) for v in value_counts.values],
+        "x": x,
+        "y": y,
         "title": f"Total Counts by {column}"
     }
 
@@ -100,6 +108,7 @@ def visualization_agent(
     numeric_cols = metadata.get("numeric_columns", [])
     categorical_cols = metadata.get("categorical_columns", [])
     datetime_cols = metadata.get("datetime_columns", [])
+    approximate = use_approximate(len(df))
 
     if len(numeric_cols) >= 2:
         charts.append(make_correlation_heatmap(df[numeric_cols]))
@@ -109,7 +118,7 @@ def visualization_agent(
         charts.append(make_boxplot(df, col))
 
     for col in categorical_cols[:5]:
-        charts.append(make_bar_chart(df, col))
+        charts.append(make_bar_chart(df, col, approximate=approximate))
 
     for col in datetime_cols:
         charts.append(make_line_chart(df, col))
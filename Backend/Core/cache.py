@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+from Core import metrics
+
+
+# Persistent JSON cache, one file per key.
+# Reads refresh the file mtime so eviction drops the least recently used
+# entries once the directory grows past max_bytes.
+
+
+CACHE_ROOT = os.getenv("CACHE_ROOT", "/tmp/datasage/cache")
+
+
+def content_hash(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DiskCache:
+
+    def __init__(self, name: str, max_bytes: int, ttl_seconds: Optional[float] = None):
+        self.name = name
+        self.directory = os.path.join(CACHE_ROOT, name)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            metrics.incr(f"{self.name}.misses")
+            return None
+
+        if self.ttl_seconds is not None and time.time() - entry["created_at"] > self.ttl_seconds:
+            self._remove(path)
+            metrics.incr(f"{self.name}.expired")
+            metrics.incr(f"{self.name}.misses")
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        metrics.incr(f"{self.name}.hits")
+        return entry["value"]
+
+    def set(self, key: str, value: Any):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "value": value}, f, default=str)
+        os.replace(tmp_path, path)
+        metrics.incr(f"{self.name}.writes")
+        self._evict()
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".json"):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):
+                self._remove(path)
+                metrics.incr(f"{self.name}.evictions")
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def stats(self) -> Dict[str, Any]:
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        return {
+            "entries": len(entries),
+            "bytes": sum(e.stat().st_size for e in entries),
+            "max_bytes": self.max_bytes,
+            "hits": metrics.get_counter(f"{self.name}.hits"),
+            "misses": metrics.get_counter(f"{self.name}.misses"),
+            "evictions": metrics.get_counter(f"{self.name}.evictions")
+        }
@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from typing import Callable, Dict, Any, Iterable, List, Optional
+from Core import metrics
+
+
+# Typed columnar copy of every cleaned upload, keyed by file id.
+# Files are uncompressed Arrow IPC (Feather v2) so they can be memory-mapped
+# and read with column projection instead of re-parsing the CSV text.
+# The directory is a cache: reads refresh a file's mtime, files idle past
+# DATASET_CACHE_TTL_SECONDS or beyond DATASET_CACHE_MAX_MB (least recently
+# used first) are deleted. Stored datasets are fetched again when needed,
+# files referenced by a chat session are pinned (see pin_datasets) since a
+# chat-only upload exists nowhere else.
+
+
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", "/tmp/datasage/datasets")
+DATASET_CACHE_MAX_MB = int(os.getenv("DATASET_CACHE_MAX_MB", "4096"))
+DATASET_CACHE_TTL_SECONDS = int(os.getenv("DATASET_CACHE_TTL_SECONDS", str(7 * 86400)))
+COLUMNAR_BUCKET = "csv-files"
+COLUMNAR_CONTENT_TYPE = "application/vnd.apache.arrow.file"
+
+
+def ensure_cache_dir():
+    os.makedirs(DATASET_CACHE_DIR, exist_ok=True)
+
+
+def columnar_path(file_id: str) -> str:
+    return os.path.join(DATASET_CACHE_DIR, f"{file_id}.arrow")
+
+
+def metadata_path(file_id: str) -> str:
+    return os.path.join(DATASET_CACHE_DIR, f"{file_id}.json")
+
+
+def storage_columnar_path(user_id: str, file_id: str) -> str:
+    return f"{user_id}/{file_id}.arrow"
+
+
+def has_columnar(file_id: Optional[str]) -> bool:
+    return bool(file_id) and os.path.exists(columnar_path(file_id))
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def delete_columnar(file_id: str):
+    _remove(columnar_path(file_id))
+    _remove(metadata_path(file_id))
+
+
+# callables returning the file ids eviction must skip
+_pin_sources: List[Callable[[], Iterable[str]]] = []
+
+
+def pin_datasets(source: Callable[[], Iterable[str]]):
+    _pin_sources.append(source)
+
+
+def evict_datasets(keep: Optional[str] = None):
+    """
+    Drop expired files, then the least recently used ones until the
+    directory fits DATASET_CACHE_MAX_MB. keep and pinned files are never
+    dropped, they still count toward the size.
+    """
+    if not os.path.isdir(DATASET_CACHE_DIR):
+        return
+    pinned = {keep}
+    for source in _pin_sources:
+        pinned.update(source())
+    now = time.time()
+    entries = []
+    total = 0
+    for entry in os.scandir(DATASET_CACHE_DIR):
+        if not entry.name.endswith(".arrow"):
+            continue
+        file_id = entry.name[:-len(".arrow")]
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        if file_id not in pinned and now - stat.st_mtime > DATASET_CACHE_TTL_SECONDS:
+            delete_columnar(file_id)
+            metrics.incr("datasets.expirations")
+            continue
+        entries.append((stat.st_mtime, stat.st_size, file_id))
+        total += stat.st_size
+
+    max_bytes = DATASET_CACHE_MAX_MB * 1024 * 1024
+    for _, size, file_id in sorted(entries):
+        if total <= max_bytes:
+            break
+        if file_id in pinned:
+            continue
+        # open memory maps stay valid, the next load fetches or rebuilds the file
+        delete_columnar(file_id)
+        metrics.incr("datasets.evictions")
+        total -= size
+
+
+def to_arrow_table(df: pd.DataFrame, schema: Optional[pa.Schema] = None) -> pa.Table:
+    """
+    Object columns holding mixed Python types cannot be typed by Arrow,
+    those are stored as strings.
+    """
+    try:
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        df = df.copy()
+        for col in df.select_dtypes(include="object").columns:
+            df[col] = df[col].map(lambda v: v if v is None or v != v else str(v))
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def _string_for_null(schema: pa.Schema) -> pa.Schema:
+    fields = [
+        field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+        for field in schema
+    ]
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def save_columnar(df: pd.DataFrame, file_id: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    ensure_cache_dir()
+    path = columnar_path(file_id)
+    tmp_path = f"{path}.tmp"
+    feather.write_feather(to_arrow_table(df), tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+    if metadata is not None:
+        save_columnar_metadata(file_id, metadata)
+    evict_datasets(keep=file_id)
+    return path
+
+
+def save_columnar_metadata(file_id: str, metadata: Dict[str, Any]):
+    ensure_cache_dir()
+    with open(metadata_path(file_id), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, default=str)
+
+
+def load_columnar_metadata(file_id: str) -> Optional[Dict[str, Any]]:
+    path = metadata_path(file_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_columnar(file_id: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Memory-mapped read. Only the requested columns are touched,
+    split_blocks lets pandas keep numeric columns zero-copy where possible.
+    """
+    path = columnar_path(file_id)
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return table.to_pandas(split_blocks=True)
+
+
+class ColumnarWriter:
+    """
+    Sink for Preprocess_data_streaming: appends cleaned chunks to the
+    columnar file so the full frame never has to be held in memory.
+    """
+
+    def __init__(self, file_id: str):
+        ensure_cache_dir()
+        self.file_id = file_id
+        self.path = columnar_path(file_id)
+        self._tmp_path = f"{self.path}.tmp"
+        self._sink = None
+        self._writer = None
+        self._schema = None
+
+    def __call__(self, chunk: pd.DataFrame):
+        if self._writer is None:
+            self._schema = _string_for_null(to_arrow_table(chunk.head(0)).schema)
+            self._sink = pa.OSFile(self._tmp_path, "wb")
+            self._writer = pa.ipc.new_file(self._sink, self._schema)
+        self._writer.write_table(to_arrow_table(chunk, schema=self._schema))
+
+    def close(self) -> str:
+        if self._writer is None:
+            return self.path
+        self._writer.close()
+        self._sink.close()
+        os.replace(self._tmp_path, self.path)
+        evict_datasets(keep=self.file_id)
+        return self.path
+
+
+def link_columnar(supabase, csv_storage_path: str, storage_path: str) -> bool:
+    """
+    Record the columnar copy on the files row. Needs the files.columnar_path
+    column (Backend/migrations/001_files_columnar_path.sql); when the update
+    fails the upload still succeeds, the file is just converted again later.
+    """
+    try:
+        supabase.table("files").update({
+            "columnar_path": storage_path
+        }).eq("storage_path", csv_storage_path).execute()
+        return True
+    except Exception as e:
+        print(f"Columnar path not recorded ====> {e}")
+        return False
+
+
+def upload_columnar(supabase, user_id: str, file_id: str, csv_storage_path: str) -> Optional[str]:
+    """
+    Store the columnar file next to the raw CSV and link it from the files row.
+    None when that failed, the local copy is kept either way.
+    """
+    storage_path = storage_columnar_path(user_id, file_id)
+    try:
+        with open(columnar_path(file_id), "rb") as f:
+            supabase.storage.from_(COLUMNAR_BUCKET).upload(
+                storage_path,
+                f.read(),
+                {"content-type": COLUMNAR_CONTENT_TYPE}
+            )
+    except Exception as e:
+        print(f"Columnar upload failed ====> {e}")
+        return None
+    return storage_path if link_columnar(supabase, csv_storage_path, storage_path) else None
+
+
+def copy_columnar(supabase, source_path: str, user_id: str, file_id: str, csv_storage_path: str) -> Optional[str]:
+    """
+    Give file_id its own copy of a stored columnar file, every user only
+    ever reads objects under their own prefix. None when that failed.
+    """
+    storage_path = storage_columnar_path(user_id, file_id)
+    try:
+        supabase.storage.from_(COLUMNAR_BUCKET).copy(source_path, storage_path)
+    except Exception as e:
+        print(f"Columnar copy failed ====> {e}")
+        return None
+    return storage_path if link_columnar(supabase, csv_storage_path, storage_path) else None
+
+
+def fetch_columnar(supabase, storage_path: str, file_id: str) -> str:
+    """
+    Make sure a local copy exists (another instance may have converted it).
+    """
+    if not has_columnar(file_id):
+        ensure_cache_dir()
+        content = supabase.storage.from_(COLUMNAR_BUCKET).download(storage_path)
+        tmp_path = f"{columnar_path(file_id)}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, columnar_path(file_id))
+        evict_datasets(keep=file_id)
+    return columnar_path(file_id)
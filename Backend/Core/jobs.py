@@ -0,0 +1,144 @@
+import os
+import time
+import uuid
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+# Background jobs for long-running analyses.
+# Work runs on a bounded worker pool so the event loop stays free, every job
+# keeps an ordered event log that clients can poll or follow over SSE.
+# Job state lives in this process only: run the API with a single uvicorn
+# worker (or sticky routing per job id), otherwise a poll can land on a
+# worker that never saw the job and gets a 404. Finished jobs are dropped
+# JOB_TTL_SECONDS after their last event, checked on every submit and read.
+
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+EVENT_POLL_SECONDS = 0.25
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="analysis-job")
+_jobs: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+
+
+def publish(job_id: str, event_type: str, data: Optional[Dict[str, Any]] = None):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job["events"].append({
+            "seq": len(job["events"]),
+            "type": event_type,
+            "time": time.time(),
+            "data": data or {}
+        })
+        job["updated_at"] = time.time()
+
+
+def _set_status(job_id: str, status: str, **fields):
+    with _lock:
+        _jobs[job_id].update(status=status, **fields)
+
+
+def _run(job_id: str, fn: Callable, args: tuple):
+    _set_status(job_id, "running")
+    publish(job_id, "started")
+
+    def progress(event_type: str, data: Optional[Dict[str, Any]] = None):
+        publish(job_id, event_type, data)
+
+    try:
+        result = fn(*args, progress=progress)
+    except Exception as e:
+        _set_status(job_id, "failed", error=str(e))
+        publish(job_id, "failed", {"error": str(e)})
+        raise
+    _set_status(job_id, "completed", result=result)
+    publish(job_id, "completed")
+    return result
+
+
+def _prune():
+    cutoff = time.time() - JOB_TTL_SECONDS
+    with _lock:
+        stale = [
+            job_id for job_id, job in _jobs.items()
+            if job["status"] in ("completed", "failed") and job["updated_at"] < cutoff
+        ]
+        for job_id in stale:
+            del _jobs[job_id]
+
+
+def submit_job(fn: Callable, *args, user_id: str) -> str:
+    """
+    fn receives the given args plus a progress(event_type, data) callback.
+    """
+    _prune()
+    job_id = str(uuid.uuid4())
+    with _lock:
+        _jobs[job_id] = {
+            "id": job_id,
+            "user_id": str(user_id),
+            "status": "queued",
+            "events": [],
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "updated_at": time.time(),
+            "future": None
+        }
+    publish(job_id, "queued")
+    future = _executor.submit(_run, job_id, fn, args)
+    with _lock:
+        _jobs[job_id]["future"] = future
+    return job_id
+
+
+def get_job(job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    _prune()
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job["user_id"] != str(user_id):
+            return None
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "events": list(job["events"]),
+            "result": job["result"],
+            "error": job["error"]
+        }
+
+
+async def wait_job(job_id: str) -> Any:
+    with _lock:
+        future = _jobs[job_id]["future"]
+    return await asyncio.wrap_future(future)
+
+
+def events_since(job_id: str, seq: int) -> List[Dict[str, Any]]:
+    _prune()
+    with _lock:
+        job = _jobs.get(job_id)
+        return list(job["events"][seq:]) if job else []
+
+
+async def follow_events(job_id: str, last_seq: int = -1):
+    """
+    Async generator over a job's events, ends after completed/failed.
+    """
+    next_seq = last_seq + 1
+    while True:
+        events = events_since(job_id, next_seq)
+        for event in events:
+            yield event
+            if event["type"] in ("completed", "failed"):
+                return
+        next_seq += len(events)
+        with _lock:
+            if job_id not in _jobs:
+                return
+        await asyncio.sleep(EVENT_POLL_SECONDS)
@@ -0,0 +1,390 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import contextvars
+import weakref
+from collections import deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+from groq import APIConnectionError, APIStatusError
+from langchain_groq import ChatGroq
+from Core import metrics
+from Core.cache import content_hash
+from Core.llm_stub import StubChatModel
+
+
+# One gateway for every LLM call of the process (chat, memory, insights).
+# Upstream requests go through pooled HTTP connections, at most
+# LLM_MAX_CONCURRENCY are in flight (LLM_MAX_PER_USER per user), the rest wait
+# in FIFO order. 429 and 5xx responses are retried with jittered exponential
+# backoff, identical prompts already in flight share one upstream call.
+# Analyses run on their own event loops in the job threads, so the limits are
+# thread-safe and each event loop gets its own connection pool.
+# LLM_BACKEND=stub swaps the provider for the local StubChatModel, everything
+# else (limits, retries, coalescing, metrics) stays in the path.
+
+
+load_dotenv()
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+LLM_MODEL = os.getenv("LLM_MODEL", "openai/gpt-oss-20b")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_PER_USER = int(os.getenv("LLM_MAX_PER_USER", "2"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "8"))
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# who the current LLM calls are made for, set by the routes and the analysis runner
+_current_user: contextvars.ContextVar = contextvars.ContextVar("llm_user", default=None)
+
+
+@contextmanager
+def llm_user(user_id: Optional[str]):
+    token = _current_user.set(user_id)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+class _Abandoned(Exception):
+    """
+    The caller making a shared upstream call was cancelled.
+    """
+
+
+class Slots:
+    """
+    FIFO counting semaphore usable from any thread and any event loop.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def idle(self) -> bool:
+        return self.in_use == 0 and not self._waiters
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_use < self.limit and not self._waiters:
+                self.in_use += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            # the slot was handed over just before the cancellation
+            if not queued and waiter[1].done() and not waiter[1].cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self.in_use -= 1
+                return
+            # the slot passes to the next waiter, in_use stays the same
+            loop, future = self._waiters.popleft()
+        loop.call_soon_threadsafe(self._wake, future)
+
+    def _wake(self, future: asyncio.Future):
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """
+    Seconds to wait before the next attempt, None if the error is final.
+    """
+    if isinstance(error, APIStatusError):
+        if error.status_code not in RETRY_STATUS:
+            return None
+        retry_after = error.response.headers.get("retry-after")
+    elif isinstance(error, APIConnectionError):
+        retry_after = None
+    else:
+        return None
+    delay = random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+    try:
+        delay = max(delay, float(retry_after))
+    except (TypeError, ValueError):
+        pass
+    return min(delay, LLM_RETRY_MAX_SECONDS)
+
+
+def _count_tokens(message: Any):
+    usage = getattr(message, "usage_metadata", None) or {}
+    metrics.incr("llm.input_tokens", usage.get("input_tokens", 0))
+    metrics.incr("llm.output_tokens", usage.get("output_tokens", 0))
+
+
+def prompt_key(model_name: str, temperature: float, messages: List[Any]) -> str:
+    return content_hash(
+        model_name,
+        str(temperature),
+        json.dumps([(m.type, m.content) for m in messages], default=str)
+    )
+
+
+class LLMGateway:
+
+    def __init__(
+        self,
+        backend: str = LLM_BACKEND,
+        model_name: str = LLM_MODEL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_per_user: int = LLM_MAX_PER_USER,
+        max_retries: int = LLM_MAX_RETRIES
+    ):
+        if backend not in ("groq", "stub"):
+            raise ValueError(f"Unknown LLM_BACKEND: {backend}")
+        self.backend = backend
+        # stub answers must never be served from caches keyed by model name
+        self.model_name = model_name if backend == "groq" else "stub"
+        self._stub = StubChatModel() if backend == "stub" else None
+        self.max_retries = max_retries
+        self.max_per_user = max_per_user
+        self.slots = Slots(max_concurrency)
+        self._user_slots: Dict[str, Slots] = {}
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        # event loop -> (pooled http client, temperature -> chat model)
+        self._pools: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def client(self, temperature: float = 0) -> "GatewayClient":
+        return GatewayClient(self, temperature)
+
+    def _model(self, temperature: float):
+        if self._stub is not None:
+            return self._stub
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._pools.get(loop)
+            if pool is None:
+                http_client = httpx.AsyncClient(limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS
+                ))
+                pool = self._pools[loop] = (http_client, {})
+            models = pool[1]
+            if temperature not in models:
+                # retries are done here, not by the SDK
+                models[temperature] = ChatGroq(
+                    model=self.model_name,
+                    temperature=temperature,
+                    api_key=GROQ_API_KEY,
+                    max_retries=0,
+                    http_async_client=pool[0]
+                )
+            return models[temperature]
+
+    async def aclose(self):
+        """
+        Close the connection pool of the running event loop.
+        """
+        with self._lock:
+            pool = self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool[0].aclose()
+
+    def _slots_for(self, user_id: str) -> Slots:
+        with self._lock:
+            slots = self._user_slots.get(user_id)
+            if slots is None:
+                slots = self._user_slots[user_id] = Slots(self.max_per_user)
+            return slots
+
+    def _forget_user(self, user_id: str, slots: Slots):
+        with self._lock:
+            if slots.idle and self._user_slots.get(user_id) is slots:
+                del self._user_slots[user_id]
+
+    async def ainvoke(self, messages: List[Any], temperature: float = 0):
+        key = prompt_key(self.model_name, temperature, messages)
+        while True:
+            with self._lock:
+                shared = self._in_flight.get(key)
+                if shared is None:
+                    shared = self._in_flight[key] = Future()
+                    leader = True
+                else:
+                    leader = False
+
+            if leader:
+                return await self._lead(key, shared, messages, temperature)
+
+            metrics.incr("llm.coalesced")
+            try:
+                # shield: a follower giving up must not cancel the shared call
+                return await asyncio.shield(asyncio.wrap_future(shared))
+            except _Abandoned:
+                continue
+
+    async def _lead(self, key: str, shared: Future, messages: List[Any], temperature: float):
+        try:
+            response = await self._call(messages, temperature)
+        except asyncio.CancelledError:
+            shared.set_exception(_Abandoned())
+            raise
+        except Exception as e:
+            shared.set_exception(e)
+            raise
+        else:
+            shared.set_result(response)
+            return response
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    @asynccontextmanager
+    async def _slot(self):
+        """
+        Holds a per-user and a global slot, in that order, so queued requests
+        of one user do not take global slots from the others.
+        """
+        user_id = _current_user.get()
+        user_slots = self._slots_for(user_id) if user_id else None
+        queued = time.perf_counter()
+        if user_slots is not None:
+            await user_slots.acquire()
+        try:
+            await self.slots.acquire()
+            try:
+                metrics.observe("llm.queue_seconds", time.perf_counter() - queued)
+                yield
+            finally:
+                self.slots.release()
+        finally:
+            if user_slots is not None:
+                user_slots.release()
+                self._forget_user(user_id, user_slots)
+
+    async def _call(self, messages: List[Any], temperature: float):
+        async with self._slot():
+            return await self._call_with_retries(messages, temperature)
+
+    async def _call_with_retries(self, messages: List[Any], temperature: float):
+        model = self._model(temperature)
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            metrics.incr("llm.requests")
+            try:
+                response = await model.ainvoke(messages)
+            except Exception as e:
+                delay = _retry_delay(e, attempt) if attempt < self.max_retries else None
+                if delay is None:
+                    metrics.incr("llm.errors")
+                    raise
+                attempt += 1
+                metrics.incr("llm.retries")
+                print(f"LLM call failed, retry {attempt} in {delay:.2f}s ====> {e}")
+                await asyncio.sleep(delay)
+                continue
+
+            metrics.observe("llm.latency_seconds", time.perf_counter() - started)
+            _count_tokens(response)
+            return response
+
+    async def astream(self, messages: List[Any], temperature: float = 0):
+        """
+        Message chunks as the model produces them. Limits and metrics apply
+        like ainvoke; a failed attempt is only retried before its first chunk,
+        and streams are never shared between callers.
+        """
+        model = self._model(temperature)
+        async with self._slot():
+            attempt = 0
+            while True:
+                started = time.perf_counter()
+                streamed = False
+                metrics.incr("llm.requests")
+                try:
+                    async for chunk in model.astream(messages):
+                        if not streamed:
+                            metrics.observe("llm.first_token_seconds", time.perf_counter() - started)
+                            streamed = True
+                        _count_tokens(chunk)
+                        yield chunk
+                except Exception as e:
+                    delay = _retry_delay(e, attempt) if attempt < self.max_retries and not streamed else None
+                    if delay is None:
+                        metrics.incr("llm.errors")
+                        raise
+                    attempt += 1
+                    metrics.incr("llm.retries")
+                    print(f"LLM stream failed, retry {attempt} in {delay:.2f}s ====> {e}")
+                    await asyncio.sleep(delay)
+                    continue
+                metrics.observe("llm.latency_seconds", time.perf_counter() - started)
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            users = len(self._user_slots)
+            shared = len(self._in_flight)
+        return {
+            "backend": self.backend,
+            "model": self.model_name,
+            "in_flight": self.slots.in_use,
+            "max_concurrency": self.slots.limit,
+            "max_per_user": self.max_per_user,
+            "active_users": users,
+            "shared_calls": shared
+        }
+
+
+class GatewayClient:
+    """
+    What the agents hold instead of a chat model: ainvoke, astream and invoke
+    at a fixed temperature, every call goes through the gateway.
+    """
+
+    def __init__(self, gateway: LLMGateway, temperature: float):
+        self.gateway = gateway
+        self.temperature = temperature
+
+    @property
+    def model_name(self) -> str:
+        return self.gateway.model_name
+
+    async def ainvoke(self, messages: List[Any]):
+        return await self.gateway.ainvoke(messages, self.temperature)
+
+    def astream(self, messages: List[Any]):
+        return self.gateway.astream(messages, self.temperature)
+
+    def invoke(self, messages: List[Any]):
+        """
+        Blocking call for scripts, not for code already running in an event loop.
+        """
+        async def run():
+            try:
+                return await self.ainvoke(messages)
+            finally:
+                await self.gateway.aclose()
+        return asyncio.run(run())
+
+
+gateway = LLMGateway()
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import math
+import random
+import asyncio
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from Agents.Schemas import InsightResponse
+from Core.cache import content_hash
+
+
+# Local stand-in for the LLM provider, selected with LLM_BACKEND=stub.
+# It recognizes the prompts of the app (insights, chat query plan, chat
+# answer, memory summary) and returns output of the right shape, after a
+# first-token latency and at a token rate drawn from log-normal
+# distributions. Everything is seeded by the prompt, so a benchmark run
+# sees the same answers and the same timings every time, without network.
+
+
+LLM_STUB_SEED = os.getenv("LLM_STUB_SEED", "0")
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "400"))
+LLM_STUB_LATENCY_SIGMA = float(os.getenv("LLM_STUB_LATENCY_SIGMA", "0.3"))
+LLM_STUB_TOKENS_PER_SECOND = float(os.getenv("LLM_STUB_TOKENS_PER_SECOND", "200"))
+LLM_STUB_RATE_SIGMA = float(os.getenv("LLM_STUB_RATE_SIGMA", "0.2"))
+LLM_STUB_ANSWER_TOKENS = int(os.getenv("LLM_STUB_ANSWER_TOKENS", "60"))
+
+WORDS = (
+    "the dataset shows a clear pattern in the selected rows with values that "
+    "stay close to the overall average while a few groups differ noticeably"
+).split()
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(str(m.content) for m in messages)
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _words(rng: random.Random, tokens: int) -> str:
+    sentences = []
+    while tokens > 0:
+        size = min(tokens, rng.randint(8, 16))
+        sentences.append(_sentence(rng, size))
+        tokens -= size
+    return " ".join(sentences)
+
+
+def stub_response(prompt: str, rng: random.Random) -> str:
+    """
+    Output of the right shape for each prompt the app sends.
+    """
+    if "key_insights" in prompt and "recommendations" in prompt:
+        return InsightResponse(
+            summary=_words(rng, 40),
+            key_insights=[_sentence(rng, 12) for _ in range(rng.randint(3, 5))],
+            risks=[_sentence(rng, 10) for _ in range(rng.randint(2, 3))],
+            recommendations=[_sentence(rng, 10) for _ in range(rng.randint(2, 4))]
+        ).model_dump_json()
+    if "into a query plan" in prompt:
+        return json.dumps({
+            "mode": "aggregate",
+            "aggregations": [{"func": "count", "column": None}],
+            "limit": 10
+        })
+    if "running summary of a conversation" in prompt:
+        return _words(rng, 40)
+    return _words(rng, max(1, int(rng.gauss(LLM_STUB_ANSWER_TOKENS, LLM_STUB_ANSWER_TOKENS / 4))))
+
+
+class StubChatModel(BaseChatModel):
+    latency_ms: float = LLM_STUB_LATENCY_MS
+    latency_sigma: float = LLM_STUB_LATENCY_SIGMA
+    tokens_per_second: float = LLM_STUB_TOKENS_PER_SECOND
+    rate_sigma: float = LLM_STUB_RATE_SIGMA
+    seed: str = LLM_STUB_SEED
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _plan(self, messages: List[BaseMessage]):
+        """
+        (prompt text, response split in tokens, first-token delay, delay
+        per token), all derived from the prompt.
+        """
+        prompt = _prompt_text(messages)
+        rng = random.Random(content_hash(self.seed, prompt))
+        text = stub_response(prompt, rng)
+        first = self.latency_ms / 1000 * math.exp(rng.gauss(0, self.latency_sigma))
+        rate = self.tokens_per_second * math.exp(rng.gauss(0, self.rate_sigma))
+        tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+        return prompt, tokens, first, 1 / rate
+
+    def _usage(self, prompt: str, tokens: List[str]) -> dict:
+        input_tokens = len(prompt) // 4 + 1
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": len(tokens),
+            "total_tokens": input_tokens + len(tokens)
+        }
+
+    def _result(self, prompt: str, tokens: List[str]) -> ChatResult:
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(prompt, tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        prompt, tokens, first, per_token = self._plan(messages)
+        time.sleep(first + per_token * len(tokens))
+        return self._result(prompt, tokens)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        prompt, tokens, first, per_token = self._plan(messages)
+        await asyncio.sleep(first + per_token * len(tokens))
+        return self._result(prompt, tokens)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        prompt, tokens, first, per_token = self._plan(messages)
+        time.sleep(first)
+        for token in tokens:
+            time.sleep(per_token)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, tokens)))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        prompt, tokens, first, per_token = self._plan(messages)
+        await asyncio.sleep(first)
+        for token in tokens:
+            await asyncio.sleep(per_token)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, tokens)))
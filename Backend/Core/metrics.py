@@ -0,0 +1,43 @@
+import threading
+from typing import Dict, Any
+
+
+# Process-wide counters and timing summaries, exposed on GET /metrics.
+
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = {}
+_observations: Dict[str, Dict[str, float]] = {}
+
+
+def incr(name: str, value: int = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name: str, value: float):
+    with _lock:
+        entry = _observations.get(name)
+        if entry is None:
+            _observations[name] = {"count": 1, "total": value, "min": value, "max": value}
+            return
+        entry["count"] += 1
+        entry["total"] += value
+        entry["min"] = min(entry["min"], value)
+        entry["max"] = max(entry["max"], value)
+
+
+def get_counter(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "observations": {
+                name: {**entry, "avg": entry["total"] / entry["count"]}
+                for name, entry in _observations.items()
+            }
+        }
@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import pandas as pd
+from Core import metrics
+from Core.columnar import has_columnar, save_columnar, load_columnar, delete_columnar, pin_datasets
+
+
+# Chat sessions, one per user, shared by every worker process.
+# Which dataset a user is chatting with is recorded in a local SQLite index,
+# the data itself is the memory-mapped columnar file of that dataset, so any
+# worker can open any user's session. Each worker keeps the sessions it
+# recently served in memory under a byte budget, in least-recently-used order.
+# Sessions over budget or idle past their TTL are dropped from memory only and
+# reopened from the index on the next access.
+
+
+SESSION_MAX_MB = int(os.getenv("SESSION_MAX_MB", "1024"))
+SESSION_IDLE_TTL_SECONDS = int(os.getenv("SESSION_IDLE_TTL_SECONDS", "1800"))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "/tmp/datasage/sessions.db")
+
+
+def dataframe_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+class SessionIndex:
+    """
+    user id -> (file id, metadata), safe to use from several processes.
+    """
+
+    def __init__(self, path: str = SESSION_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._execute("PRAGMA journal_mode=WAL")
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id TEXT PRIMARY KEY, file_id TEXT NOT NULL, "
+            "metadata TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "owned INTEGER NOT NULL DEFAULT 0)"
+        )
+        # indexes created before the owned column
+        columns = {row[1] for row in self._execute("PRAGMA table_info(sessions)")}
+        if "owned" not in columns:
+            self._execute("ALTER TABLE sessions ADD COLUMN owned INTEGER NOT NULL DEFAULT 0")
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS memories ("
+            "user_id TEXT PRIMARY KEY, file_id TEXT NOT NULL, "
+            "memory TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        # a short-lived connection per call, sqlite handles the cross-process locking
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def set(self, user_id: str, file_id: str, metadata: Dict[str, Any], owned: bool = False):
+        """
+        owned: the session created the file (a chat-only upload), nothing
+        else refers to it once the session is replaced.
+        """
+        self._execute(
+            "INSERT OR REPLACE INTO sessions (user_id, file_id, metadata, updated_at, owned) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user_id, file_id, json.dumps(metadata, default=str), time.time(), int(owned))
+        )
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute(
+            "SELECT file_id, metadata, owned FROM sessions WHERE user_id = ?", (user_id,)
+        )
+        if not rows:
+            return None
+        return {"file_id": rows[0][0], "metadata": json.loads(rows[0][1]), "owned": bool(rows[0][2])}
+
+    def file_ids(self) -> List[str]:
+        return [row[0] for row in self._execute("SELECT DISTINCT file_id FROM sessions")]
+
+    def get_memory(self, user_id: str, file_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Conversation memory of the user's chat about file_id, a chat about
+        another dataset does not carry over.
+        """
+        rows = self._execute(
+            "SELECT memory FROM memories WHERE user_id = ? AND file_id = ?", (user_id, file_id)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def set_memory(self, user_id: str, file_id: str, memory: Dict[str, Any]):
+        self._execute(
+            "INSERT OR REPLACE INTO memories VALUES (?, ?, ?, ?)",
+            (user_id, file_id, json.dumps(memory), time.time())
+        )
+
+    def clear_memory(self, user_id: str):
+        self._execute("DELETE FROM memories WHERE user_id = ?", (user_id,))
+
+    def count(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM sessions")[0][0]
+
+
+class SessionStore:
+    """
+    build(df, metadata) creates the per-session objects that are not worth
+    sharing (the compiled chat graph), each worker calls it when it opens
+    a session.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        build: Callable[[pd.DataFrame, Dict[str, Any]], Any],
+        max_bytes: int = SESSION_MAX_MB * 1024 * 1024,
+        ttl_seconds: float = SESSION_IDLE_TTL_SECONDS,
+        index: Optional[SessionIndex] = None
+    ):
+        self.name = name
+        self.build = build
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.index = index or SessionIndex()
+        # a session's file must outlive the dataset cache's eviction
+        pin_datasets(self.index.file_ids)
+        self._active: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def put(
+        self,
+        user_id: str,
+        file_id: str,
+        df: pd.DataFrame,
+        metadata: Dict[str, Any],
+        owned: bool = False
+    ) -> Dict[str, Any]:
+        """
+        df must already be saved as the columnar file of file_id.
+        Starts a new conversation. The file of the session it replaces is
+        deleted if that session created it, analyzed uploads keep theirs for
+        re-analysis and only become evictable.
+        """
+        previous = self.index.get(user_id)
+        self.index.set(user_id, file_id, metadata, owned)
+        if previous is not None and previous["owned"] and previous["file_id"] != file_id:
+            delete_columnar(previous["file_id"])
+        self.index.clear_memory(user_id)
+        return self._activate(user_id, file_id, df, metadata)
+
+    def _activate(self, user_id: str, file_id: str, df: pd.DataFrame, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        graph = self.build(df, metadata)
+        session = {
+            "df": df,
+            "graph": graph,
+            "metadata": metadata,
+            "file_id": file_id,
+            # built objects may report their own size (the chat graph's text index)
+            "bytes": dataframe_bytes(df) + getattr(graph, "nbytes", 0),
+            "last_used": time.time()
+        }
+        with self._lock:
+            self._drop(user_id)
+            self._active[user_id] = session
+            self._bytes += session["bytes"]
+            spilled = self._enforce_budget()
+        self._spill(spilled)
+        return session
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        record = self.index.get(user_id)
+        with self._lock:
+            spilled = self._expire_idle()
+        self._spill(spilled)
+        with self._lock:
+            if record is None:
+                self._drop(user_id)
+                metrics.incr(f"{self.name}.misses")
+                return None
+            session = self._active.get(user_id)
+            # another worker may have switched the user to a different dataset
+            if session is not None and session["file_id"] == record["file_id"]:
+                session["last_used"] = time.time()
+                self._active.move_to_end(user_id)
+                metrics.incr(f"{self.name}.hits")
+                return session
+
+        if not has_columnar(record["file_id"]):
+            metrics.incr(f"{self.name}.misses")
+            return None
+
+        metrics.incr(f"{self.name}.reloads")
+        df = load_columnar(record["file_id"])
+        return self._activate(user_id, record["file_id"], df, record["metadata"])
+
+    def memory(self, user_id: str, file_id: str) -> Optional[Dict[str, Any]]:
+        return self.index.get_memory(user_id, file_id)
+
+    def save_memory(self, user_id: str, file_id: str, memory: Dict[str, Any]):
+        self.index.set_memory(user_id, file_id, memory)
+
+    def _drop(self, user_id: str) -> Optional[Dict[str, Any]]:
+        session = self._active.pop(user_id, None)
+        if session is not None:
+            self._bytes -= session["bytes"]
+        return session
+
+    def _spill(self, spilled: List[Tuple[str, Dict[str, Any]]]):
+        """
+        Save the frames of dropped sessions whose file is gone, called
+        without the lock so other requests are not held up by the I/O.
+        """
+        for user_id, session in spilled:
+            if has_columnar(session["file_id"]):
+                continue
+            # a session replaced on another worker has had its file deleted
+            record = self.index.get(user_id)
+            if record is not None and record["file_id"] == session["file_id"]:
+                save_columnar(session["df"], session["file_id"])
+
+    def _expire_idle(self) -> List[Tuple[str, Dict[str, Any]]]:
+        cutoff = time.time() - self.ttl_seconds
+        spilled = []
+        while self._active:
+            user_id, session = next(iter(self._active.items()))
+            if session["last_used"] >= cutoff:
+                break
+            spilled.append((user_id, self._drop(user_id)))
+            metrics.incr(f"{self.name}.expirations")
+        return spilled
+
+    def _enforce_budget(self) -> List[Tuple[str, Dict[str, Any]]]:
+        # the most recent session always stays, even if it alone is over budget
+        spilled = []
+        while self._bytes > self.max_bytes and len(self._active) > 1:
+            user_id = next(iter(self._active))
+            spilled.append((user_id, self._drop(user_id)))
+            metrics.incr(f"{self.name}.evictions")
+        return spilled
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active_sessions": len(self._active),
+                "indexed_sessions": self.index.count(),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": metrics.get_counter(f"{self.name}.hits"),
+                "misses": metrics.get_counter(f"{self.name}.misses"),
+                "reloads": metrics.get_counter(f"{self.name}.reloads"),
+                "evictions": metrics.get_counter(f"{self.name}.evictions"),
+                "expirations": metrics.get_counter(f"{self.name}.expirations")
+            }
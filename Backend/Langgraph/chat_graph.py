@@ -1,62 +1,145 @@
 import os
+import re
+import json
+import asyncio
 import pandas as pd
-from typing import TypedDict
+from typing import Any, Dict, Optional
 
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, END
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import HumanMessage
+from Agents.text_index import InvertedIndex, estimate_tokens
+from Agents.Schemas import QuerySpec
+from Agents.dedup import row_hashes
+from Core.cache import content_hash
+from Core.llm import gateway
+from Agents.query_engine import QueryError, parse_query_spec, run_query, describe_query
+from Agents.chat_context import build_dataset_context
+from Langgraph.chat_state import GraphState
+from Langgraph.chat_memory import format_memory, is_follow_up
 
 load_dotenv()
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1500"))
+CHAT_TOP_ROWS = int(os.getenv("CHAT_TOP_ROWS", "20"))
+CHAT_LLM_TIMEOUT_SECONDS = float(os.getenv("CHAT_LLM_TIMEOUT_SECONDS", "30"))
+# bump when prompts or the graph change what an answer would be
+CHAT_PIPELINE_VERSION = "4"
 
-class GraphState(TypedDict):
-    question: str
-    context: str
-    answer: str
-
-llm = ChatGroq(
-    model="openai/gpt-oss-20b",
-    temperature=0,
-    api_key=GROQ_API_KEY
-)
+llm = gateway.client(temperature=0)
 
 # ---------- CSV HELPERS (LIGHTWEIGHT) ----------
 
 def load_csv_once(file_path: str) -> pd.DataFrame:
     return pd.read_csv(file_path)
 
+def dataset_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Content hash of the data, identical uploads share it whoever made them.
+    """
+    return content_hash(
+        json.dumps(list(map(str, df.columns))),
+        json.dumps(df.dtypes.astype(str).tolist()),
+        row_hashes(df).tobytes()
+    )
+
 def get_csv_metadata(df: pd.DataFrame):
     return {
         "columns": list(df.columns),
         "total_columns": len(df.columns),
         "total_rows": len(df),
-        "dtypes": df.dtypes.astype(str).to_dict()
+        "dtypes": df.dtypes.astype(str).to_dict(),
+        "fingerprint": dataset_fingerprint(df),
+        "context": build_dataset_context(df)
     }
 
-def build_csv_summary(df: pd.DataFrame, max_rows: int = 5) -> str:
-    sample = df.head(max_rows)
-    return sample.to_csv(index=False)
-
-def get_relevant_rows(df: pd.DataFrame, question: str, limit: int = 8) -> str:
-    keywords = question.lower().split()
-    mask = pd.Series([False] * len(df))
-
-    for col in df.columns:
-        if df[col].dtype == object:
-            mask = mask | df[col].str.lower().str.contains("|".join(keywords), na=False)
-
-    filtered = df[mask].head(limit)
-    if filtered.empty:
-        return "No directly matching rows found."
+def normalize_question(question: str) -> str:
+    """
+    Case, surrounding whitespace and trailing punctuation do not change
+    the answer, operators and inner punctuation do.
+    """
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+def answer_cache_key(metadata, question: str, memory: Optional[Dict[str, Any]] = None) -> str:
+    """
+    A follow-up depends on the conversation, so then the memory is part of the
+    key. Standalone questions key on the data and the question only and are
+    shared across users and conversations.
+    """
+    conversation = format_memory(memory["summary"], memory["history"]) if memory else ""
+    if conversation and not is_follow_up(question, metadata["columns"]):
+        conversation = ""
+    return content_hash(
+        CHAT_PIPELINE_VERSION,
+        llm.model_name,
+        metadata["fingerprint"],
+        normalize_question(question),
+        conversation
+    )
 
-    return filtered.to_csv(index=False)
+def rows_within_budget(df: pd.DataFrame, max_tokens: int = CHAT_CONTEXT_TOKENS) -> str:
+    """
+    CSV text of df, cut after the last row that still fits the token budget.
+    """
+    lines = df.to_csv(index=False).splitlines()
+    kept, used = [], 0
+    for line in lines:
+        used += estimate_tokens(line)
+        if used > max_tokens and len(kept) > 1:
+            break
+        kept.append(line)
+    return "\n".join(kept)
+
+def get_relevant_rows(
+    df: pd.DataFrame,
+    index: InvertedIndex,
+    question: str,
+    limit: int = CHAT_TOP_ROWS,
+    max_tokens: int = CHAT_CONTEXT_TOKENS
+) -> str:
+    rows, _ = index.rank(question, limit)
+    if len(rows) == 0:
+        return "No directly matching rows found, see the sample rows above."
+
+    return "Rows ranked by relevance to the question:\n" + rows_within_budget(df.iloc[rows], max_tokens)
+
+def get_query_result(df: pd.DataFrame, spec: QuerySpec, max_tokens: int = CHAT_CONTEXT_TOKENS) -> str:
+    result = run_query(df, spec)
+    header = f"QUERY RESULT computed over all {len(df)} rows ({describe_query(spec)})"
+    if result.empty:
+        return header + ":\nNo rows matched the query."
+    text = rows_within_budget(result.head(spec.limit), max_tokens)
+    # the model must not take a top-N slice for the whole answer
+    shown = len(text.splitlines()) - 1
+    unit = "groups" if spec.mode == "aggregate" and spec.group_by else "rows"
+    if shown < len(result):
+        header += f", showing {shown} of {len(result)} result {unit}"
+    elif len(result) > 1:
+        header += f", all {len(result)} result {unit}"
+    return header + ":\n" + text
 
 # ---------- PROMPT ----------
 
-def build_prompt(metadata):
-    return ChatPromptTemplate.from_template(
-        """
+PLAN_RULES = """
+You translate questions about a table into a query plan.
+Return only one JSON object, no other text:
+{"mode": "aggregate" | "rows" | "none",
+ "filters": [{"column": str, "op": "==" | "!=" | ">" | ">=" | "<" | "<=" | "in" | "not_in" | "contains" | "is_null" | "not_null", "value": any}],
+ "group_by": [str],
+ "aggregations": [{"func": "count" | "sum" | "mean" | "median" | "min" | "max" | "std" | "nunique", "column": str or null}],
+ "sort_by": str or null,
+ "descending": bool,
+ "limit": int}
+
+Use "aggregate" for counts, totals, averages, extremes or comparisons between groups.
+Use "rows" to list rows matching conditions.
+Use "none" when the question is not about computing over the table.
+Only use the column names below, exactly as written.
+Resolve follow-up questions ("and for women?") using the conversation so far.
+An aggregation is named func_column, or "count" for a count without a column; sort_by must be such a name or a column.
+"""
+
+ANSWER_RULES = """
 You are an AI assistant answering questions about a CSV dataset.
 
 STRICT OUTPUT RULES:
@@ -65,57 +148,94 @@ Never use markdown.
 Never create lists or tables.
 Only plain sentences.
 
-DATASET INFO:
-Total Rows: {total_rows}
-Total Columns: {total_columns}
-Columns: {columns}
-Data Types: {dtypes}
-
-SAMPLE ROWS:
-{sample}
-
-RELEVANT ROWS (question-based):
-{context}
+BEHAVIOR RULES:
+Do not guess values.
+Do not count rows unless explicitly asked.
+Column questions must use metadata.
+Use the conversation so far to understand follow-up questions.
+"""
 
-Question:
-{question}
+ANSWER_SUFFIX = """
 
 Answer clearly using only the dataset.
+A QUERY RESULT was computed over every row, report its numbers as they are.
+When it shows only some of its result rows or groups, say so and give the total.
 If data is not available, say: Not available in dataset.
 """
-    )
+
+def build_prompt_prefixes(dataset_context: str):
+    """
+    Everything that does not depend on the question, assembled once per
+    session; a question only appends its own parts.
+    """
+    plan_prefix = f"{PLAN_RULES}\nDATASET:\n{dataset_context}\n\n"
+    answer_prefix = f"{ANSWER_RULES}\nDATASET:\n{dataset_context}\n\n"
+    return plan_prefix, answer_prefix
+
+def conversation_block(state: GraphState) -> str:
+    memory = format_memory(state.get("summary") or "", state.get("history") or [])
+    return f"CONVERSATION SO FAR:\n{memory}\n\n" if memory else ""
 
 # ---------- GRAPH ----------
 
 def build_csv_chat_graph(df, metadata, llm):
 
-    prompt = build_prompt(metadata)
+    index = InvertedIndex(df)
+    dataset_context = metadata.get("context") or build_dataset_context(df)
+    plan_prefix, answer_prefix = build_prompt_prefixes(dataset_context)
+
+    # LLM calls are awaited so one worker can have many questions in flight,
+    # asyncio.wait_for cancels the request once the timeout passes
+    async def plan_node(state: GraphState):
+        response = await asyncio.wait_for(
+            llm.ainvoke([HumanMessage(
+                content=plan_prefix + conversation_block(state) + "Question:\n" + state["question"]
+            )]),
+            timeout=CHAT_LLM_TIMEOUT_SECONDS
+        )
+        spec = parse_query_spec(response.content)
+        return {"query": spec.model_dump() if spec else None}
+
+    def route_plan(state: GraphState):
+        query = state.get("query")
+        return "execute" if query and query["mode"] != "none" else "retrieve"
+
+    def execute_node(state: GraphState):
+        try:
+            return {"context": get_query_result(df, QuerySpec.model_validate(state["query"]))}
+        except QueryError as e:
+            print(f"Query plan rejected ====> {e}")
+            return {"query": None, "context": get_relevant_rows(df, index, state["question"])}
 
     def retrieve_node(state: GraphState):
-        relevant_text = get_relevant_rows(df, state["question"])
+        relevant_text = get_relevant_rows(df, index, state["question"])
         return {"context": relevant_text}
 
-    def generate_node(state: GraphState):
-        messages = prompt.format_messages(
-            question=state["question"],
-            context=state["context"],
-            columns=", ".join(metadata["columns"]),
-            total_columns=metadata["total_columns"],
-            total_rows=metadata["total_rows"],
-            dtypes=metadata["dtypes"],
-            sample=build_csv_summary(df)
+    async def generate_node(state: GraphState):
+        content = (
+            answer_prefix + conversation_block(state)
+            + "DATA FOR THIS QUESTION:\n" + state["context"]
+            + "\n\nQuestion:\n" + state["question"] + ANSWER_SUFFIX
         )
-        response = llm.invoke(messages)
+        messages = [HumanMessage(content=content)]
+        response = await asyncio.wait_for(llm.ainvoke(messages), timeout=CHAT_LLM_TIMEOUT_SECONDS)
         return {"answer": response.content}
 
     graph = StateGraph(GraphState)
+    graph.add_node("plan", plan_node)
+    graph.add_node("execute", execute_node)
     graph.add_node("retrieve", retrieve_node)
     graph.add_node("generate", generate_node)
-    graph.set_entry_point("retrieve")
+    graph.set_entry_point("plan")
+    graph.add_conditional_edges("plan", route_plan, {"execute": "execute", "retrieve": "retrieve"})
+    graph.add_edge("execute", "generate")
     graph.add_edge("retrieve", "generate")
     graph.add_edge("generate", END)
 
-    return graph.compile()
+    compiled = graph.compile()
+    # the index is held by the nodes, sessions charge it next to the frame
+    compiled.nbytes = index.nbytes
+    return compiled
 
 # ---------- MAIN ----------
 
@@ -139,5 +259,5 @@ if __name__ == "__main__":
         q = input("User: ")
         if q.lower() == "exit":
             break
-        result = CHAT_GRAPH.invoke({"question": q})
+        result = asyncio.run(CHAT_GRAPH.ainvoke({"question": q}))
         print("Assistant:", result["answer"], "\n")
@@ -0,0 +1,117 @@
+import os
+import re
+import asyncio
+from typing import Any, Dict, List
+from langchain_core.messages import HumanMessage
+from Agents.text_index import estimate_tokens
+
+
+# Bounded conversation memory for a chat session.
+# The last CHAT_MEMORY_TURNS turns are kept verbatim (each clipped), older
+# turns are folded one at a time into a running summary of at most
+# CHAT_SUMMARY_TOKENS, so the memory part of a prompt never exceeds
+# CHAT_MEMORY_TURNS * CHAT_TURN_TOKENS + CHAT_SUMMARY_TOKENS.
+
+
+CHAT_MEMORY_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", "4"))
+CHAT_TURN_TOKENS = int(os.getenv("CHAT_TURN_TOKENS", "200"))
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+SUMMARY_TIMEOUT_SECONDS = float(os.getenv("CHAT_SUMMARY_TIMEOUT_SECONDS", "20"))
+
+SUMMARY_PROMPT = """
+Update the running summary of a conversation about a dataset.
+Keep the facts, numbers, columns and filters the user cared about, drop small talk.
+Plain sentences, at most {words} words. Return only the new summary.
+
+Current summary:
+{summary}
+
+Exchange to add:
+User: {question}
+Assistant: {answer}
+"""
+
+
+def empty_memory() -> Dict[str, Any]:
+    return {"summary": "", "history": []}
+
+
+def clip(text: str, max_tokens: int, keep_end: bool = False) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_chars = max_tokens * 4
+    return "..." + text[-max_chars:] if keep_end else text[:max_chars] + "..."
+
+
+# words that point back at an earlier turn ("what about them", "and for 2020")
+FOLLOW_UP_PATTERN = re.compile(
+    r"^(and|but|or|so|also|then|what about|how about)\b"
+    r"|\b(it|its|they|them|their|this|that|those|these|same|previous|earlier|"
+    r"instead|again|else|other|others|another|rest)\b"
+)
+
+
+def is_follow_up(question: str, columns: List[str]) -> bool:
+    """
+    True when the question may depend on the conversation: it refers back to
+    an earlier turn, or names none of the dataset's columns and so can only
+    be about something said before. False answers must be safe to share.
+    """
+    text = question.strip().lower()
+    if FOLLOW_UP_PATTERN.search(text):
+        return True
+    words = set(re.findall(r"[a-z0-9]+", text))
+    for col in columns:
+        parts = re.findall(r"[a-z0-9]+", str(col).lower())
+        if parts and all(part in words for part in parts):
+            return False
+    return True
+
+
+def format_memory(summary: str, history: List[Dict[str, str]]) -> str:
+    lines = []
+    if summary:
+        lines.append(f"Summary of earlier conversation: {summary}")
+    for turn in history:
+        lines.append(f"User: {turn['question']}")
+        lines.append(f"Assistant: {turn['answer']}")
+    return "\n".join(lines)
+
+
+async def fold_into_summary(llm, summary: str, turn: Dict[str, str]) -> str:
+    """
+    One LLM call per folded turn. When it fails the turn is appended and the
+    oldest part of the summary is cut instead.
+    """
+    try:
+        response = await asyncio.wait_for(
+            llm.ainvoke([HumanMessage(content=SUMMARY_PROMPT.format(
+                words=CHAT_SUMMARY_TOKENS * 3 // 4,
+                summary=summary or "(empty)",
+                question=turn["question"],
+                answer=turn["answer"]
+            ))]),
+            timeout=SUMMARY_TIMEOUT_SECONDS
+        )
+        new_summary = (response.content or "").strip()
+    except Exception as e:
+        print(f"Chat summary fallback ====> {e}")
+        new_summary = ""
+    if not new_summary:
+        new_summary = f"{summary} User asked: {turn['question']} Answer: {turn['answer']}".strip()
+    return clip(new_summary, CHAT_SUMMARY_TOKENS, keep_end=True)
+
+
+async def remember(llm, memory: Dict[str, Any], question: str, answer: str) -> Dict[str, Any]:
+    """
+    Memory after one more turn.
+    """
+    summary = memory.get("summary", "")
+    history = list(memory.get("history", []))
+    history.append({
+        "question": clip(question, CHAT_TURN_TOKENS),
+        "answer": clip(answer, CHAT_TURN_TOKENS)
+    })
+    while len(history) > CHAT_MEMORY_TURNS:
+        summary = await fold_into_summary(llm, summary, history.pop(0))
+    return {"summary": summary, "history": history}
@@ -1,5 +1,11 @@
 from typing_extensions import TypedDict
+from typing import Dict, List, Optional
+
 class GraphState(TypedDict):
     question: str
+    query: Optional[dict]
     context: str
-    answer: str
\ No newline at end of file
+    answer: str
+    # conversation memory: last turns verbatim + summary of older ones
+    history: List[Dict[str, str]]
+    summary: str
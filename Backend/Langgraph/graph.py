@@ -1,5 +1,8 @@
+import time
+import asyncio
 from langgraph.graph import StateGraph, END,START
-from Langgraph.states import DataState
+from Core.llm import gateway, llm_user
+from Langgraph.states import DataState, AnalysisBranchState, AnalysisBranchOutput, merge_timings
 from Langgraph.nodes import (
     cleaning_node,
     eda_node,
@@ -8,25 +11,97 @@ from Langgraph.nodes import (
     report_node,
 )
 
+# Bump whenever a change alters pipeline output, it invalidates cached results
+PIPELINE_VERSION = "2"
+
+# cleaning ──┬── eda ──> insight ──┬── report
+#            └── visualization ────┘
+# Charts only need df + metadata, so they are built while EDA and the LLM
+# call run. report joins both branches.
+
+branch_builder = StateGraph(AnalysisBranchState, output_schema=AnalysisBranchOutput)
+branch_builder.add_node("eda_agent", eda_node)
+branch_builder.add_node("insight_agent", insight_node)
+branch_builder.add_edge(START, "eda_agent")
+branch_builder.add_edge("eda_agent", "insight_agent")
+branch_builder.add_edge("insight_agent", END)
 
 builder = StateGraph(DataState)
 
 builder.add_node("cleaning_agent", cleaning_node)
-builder.add_node("eda_agent", eda_node)
+builder.add_node("analysis_branch", branch_builder.compile())
 builder.add_node("visualization_agent", visualization_node)
-builder.add_node("insight_agent", insight_node)
 builder.add_node("report_agent", report_node)
 
 builder.add_edge(START,"cleaning_agent")
-builder.add_edge("cleaning_agent", "eda_agent")
-builder.add_edge("eda_agent", "visualization_agent")
-builder.add_edge("visualization_agent", "insight_agent")
-builder.add_edge("insight_agent", "report_agent")
+builder.add_edge("cleaning_agent", "analysis_branch")
+builder.add_edge("cleaning_agent", "visualization_agent")
+builder.add_edge(["analysis_branch", "visualization_agent"], "report_agent")
 builder.add_edge("report_agent", END)
 
 Analysis_graph = builder.compile()
 
 
+def pipeline_timing(timings: dict, wall_seconds: float) -> dict:
+    """
+    Sum of node durations is what the old strict chain would have taken.
+    """
+    sequential = sum(timings.values())
+    return {
+        "nodes": timings,
+        "sequential_seconds": round(sequential, 4),
+        "wall_seconds": round(wall_seconds, 4),
+        "saved_seconds": round(sequential - wall_seconds, 4)
+    }
+
+
+async def arun_analysis(initial_state: DataState, config=None, progress=None) -> dict:
+    """
+    Stream the graph node by node so callers can report progress,
+    returns the final state like Analysis_graph.invoke plus "timing".
+    Insights are reported one by one as "insight_item" while they stream.
+    The insight LLM call is awaited, the CPU-bound nodes run on
+    LangGraph's executor threads.
+    """
+    state = dict(initial_state)
+    start = time.perf_counter()
+    async for namespace, mode, update in Analysis_graph.astream(
+        initial_state, config=config, stream_mode=["updates", "custom"], subgraphs=True
+    ):
+        if mode == "custom":
+            if progress is not None and "insight" in update:
+                progress("insight_item", update["insight"])
+            continue
+        for node, values in update.items():
+            if not namespace:
+                for key, value in (values or {}).items():
+                    state[key] = merge_timings(state.get(key), value) if key == "timings" else value
+            if progress is not None and node != "analysis_branch":
+                progress("node_completed", {"node": node})
+
+    state["timing"] = pipeline_timing(state.get("timings") or {}, time.perf_counter() - start)
+    print(f"Pipeline finished ====> {state['timing']}")
+    return state
+
+
+def run_analysis(initial_state: DataState, config=None, progress=None) -> dict:
+    """
+    Blocking entry point for the job workers, each run gets its own event loop.
+    LLM calls count against the user in config, the loop's connection pool
+    is closed with it.
+    """
+    user_id = ((config or {}).get("configurable") or {}).get("user_id")
+
+    async def run():
+        try:
+            return await arun_analysis(initial_state, config=config, progress=progress)
+        finally:
+            await gateway.aclose()
+
+    with llm_user(user_id):
+        return asyncio.run(run())
+
+
 if __name__ == "__main__":
     import os
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -45,5 +120,5 @@ if __name__ == "__main__":
         "insights": None,
         "report": None,
     }
-    result = Analysis_graph.invoke(initial_state)
+    result = run_analysis(initial_state)
     print(result)
\ No newline at end of file
@@ -1,37 +1,103 @@
+import time
+import inspect
+import functools
+from langgraph.config import get_stream_writer
 from Langgraph.states import DataState
-from Agents.data_cleaning import Preprocess_data
+from Agents.data_cleaning import Preprocess_data, generate_metadata
+from Agents.streaming import Preprocess_data_streaming, should_stream
 from Agents.eda import run_eda_agent
 from Agents.visualization import visualization_agent
-from Agents.insight import insight_agent
+from Agents.insight import ainsight_agent
 from Agents.reports import report_agent
+from Core.columnar import (
+    has_columnar,
+    load_columnar,
+    load_columnar_metadata,
+    save_columnar,
+    save_columnar_metadata,
+)
 
 
+def timed(name: str):
+    """
+    Record the node's wall time under state["timings"][name].
+    """
+    def wrap(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_node(state):
+                start = time.perf_counter()
+                update = await fn(state)
+                update["timings"] = {name: round(time.perf_counter() - start, 4)}
+                return update
+            return async_node
+
+        @functools.wraps(fn)
+        def node(state):
+            start = time.perf_counter()
+            update = fn(state)
+            update["timings"] = {name: round(time.perf_counter() - start, 4)}
+            return update
+        return node
+    return wrap
+
+
+@timed("cleaning_agent")
 def cleaning_node(state: DataState):
-    result = Preprocess_data(state["file_path"])
+    """
+    Datasets that were already converted are memory-mapped from the columnar
+    cache, new ones are cleaned once and converted keyed by file id.
+    """
+    file_id = state.get("file_id")
+    if has_columnar(file_id):
+        df = load_columnar(file_id)
+        return {
+            "df": df,
+            "metadata": load_columnar_metadata(file_id) or generate_metadata(df)
+        }
+
+    if should_stream(state["file_path"]):
+        # large files are never held whole, the cleaned chunks are only on disk
+        result = Preprocess_data_streaming(state["file_path"], file_id=file_id)
+        file_id = result["file_id"]
+    else:
+        result = Preprocess_data(state["file_path"])
+        if file_id and result["status"] == "success":
+            save_columnar(result["dataframe"], file_id, result["metadata"])
+
+    df = result["dataframe"]
+    if file_id and result["status"] == "success":
+        df = load_columnar(file_id)
     return {
-        "df": result["dataframe"],
+        "df": df,
         "metadata": result["metadata"]
     }
 
+@timed("eda_agent")
 def eda_node(state: DataState):
     return {
         "eda": run_eda_agent(state["df"])
     }
 
+@timed("visualization_agent")
 def visualization_node(state: DataState):
     return {
         "charts": visualization_agent(state["df"],state['metadata']),
     }
 
 
-def insight_node(state: DataState):
-    return {
-        "insights": insight_agent(
-            state["eda"],
-            state["metadata"]
-        )
-    }
+@timed("insight_agent")
+async def insight_node(state: DataState):
+    # each insight reaches the progress stream as soon as it is parsed
+    writer = get_stream_writer()
+    insights, complete = await ainsight_agent(
+        state["eda"],
+        state["metadata"],
+        on_item=lambda field, value: writer({"insight": {"field": field, "value": value}})
+    )
+    return {"insights": insights, "insights_complete": complete}
 
+@timed("report_agent")
 def report_node(state: DataState):
     return {
         "report": report_agent(
@@ -1,11 +1,39 @@
-from typing import TypedDict, Optional
+from typing import TypedDict, Optional, Annotated
 import pandas as pd
 
+
+def merge_timings(left: Optional[dict], right: Optional[dict]) -> dict:
+    """
+    Branches running in parallel each report their own node durations.
+    """
+    return {**(left or {}), **(right or {})}
+
+
 class DataState(TypedDict):
     file_path: str
+    file_id: Optional[str]
     df: Optional[pd.DataFrame]
     metadata: Optional[dict]
     eda: Optional[dict]
     charts: Optional[dict]
     insights: Optional[dict]
+    # False when the insights are partial (timeout, cut off or invalid response)
+    insights_complete: Optional[bool]
     report: Optional[dict]
+    timings: Annotated[Optional[dict], merge_timings]
+
+
+class AnalysisBranchState(TypedDict):
+    df: Optional[pd.DataFrame]
+    metadata: Optional[dict]
+    eda: Optional[dict]
+    insights: Optional[dict]
+    insights_complete: Optional[bool]
+    timings: Annotated[Optional[dict], merge_timings]
+
+
+class AnalysisBranchOutput(TypedDict):
+    eda: Optional[dict]
+    insights: Optional[dict]
+    insights_complete: Optional[bool]
+    timings: Annotated[Optional[dict], merge_timings]
@@ -1,135 +1,150 @@
 import os
+import json
+import asyncio
+import time
+import uuid
 import pandas as pd
-from typing import TypedDict, Dict
+from typing import Any, Dict, Optional, Set, Tuple
 
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from dotenv import load_dotenv
-
-from langgraph.graph import StateGraph, END
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 
 from Utils.Security import get_current_user
+from Core.database import get_supabase_client
+from Core.columnar import has_columnar, save_columnar, load_columnar, fetch_columnar
+from Core.sessions import SessionStore
+from Core.cache import DiskCache
+from Core.llm import gateway, llm_user
+from Core import metrics
+from Langgraph.chat_graph import build_csv_chat_graph, get_csv_metadata, answer_cache_key, llm
+from Langgraph.chat_memory import empty_memory, remember
 
-load_dotenv()
+chat_router = APIRouter(prefix="/csv-chat", tags=["CSV Chat"])
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-chat_router = APIRouter(prefix="/csv-chat", tags=["CSV Chat"])
+def load_csv_once(file_path: str) -> pd.DataFrame:
+    df = pd.read_csv(file_path)
+    df.columns = [c.strip() for c in df.columns]
+    return df
+
 
-llm = ChatGroq(
-    model="openai/gpt-oss-20b",
-    temperature=0,
-    api_key=GROQ_API_KEY
+# One chat session per user, bounded by SESSION_MAX_MB / SESSION_IDLE_TTL_SECONDS
+ACTIVE_CHAT_CSV = SessionStore(
+    "chat_sessions",
+    build=lambda df, metadata: build_csv_chat_graph(df=df, metadata=metadata, llm=llm)
 )
 
 
-ACTIVE_CHAT_CSV: Dict[str, Dict] = {}
+def load_memory(user_id: str, session) -> dict:
+    return ACTIVE_CHAT_CSV.memory(user_id, session["file_id"]) or empty_memory()
 
-class GraphState(TypedDict):
-    question: str
-    answer: str
 
+# Turns are saved after the response, the summary call must not delay it.
+# Saves of one conversation run one at a time, each on the latest memory,
+# so two questions answered concurrently both end up in it.
+_turn_locks: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_background_saves: Set[asyncio.Task] = set()
 
-def load_csv_once(file_path: str) -> pd.DataFrame:
-    df = pd.read_csv(file_path)
-    df.columns = [c.strip() for c in df.columns]
-    return df
 
-def get_csv_metadata(df: pd.DataFrame):
-    return {
-        "columns": list(df.columns),
-        "total_columns": len(df.columns),
-        "total_rows": len(df)
-    }
-
-def dataframe_to_context(df: pd.DataFrame, max_rows: int = 50) -> str:
-    sample = df.head(max_rows)
-    return sample.to_csv(index=False)
-
-def build_prompt(metadata):
-    return ChatPromptTemplate.from_template(
-        """
-You are an AI assistant chatting with a CSV dataset.
-
-STRICT OUTPUT RULES:
-- Never use bold text.
-- Never use markdown.
-- Never create lists or tables.
-- Plain sentences only.
-
-BEHAVIOR RULES:
-- Do not guess values.
-- Do not count rows unless explicitly asked.
-- Column questions must use metadata.
-- If info not present say: Not available in dataset.
-
-Dataset Metadata:
-Total Columns: {total_columns}
-Column Names: {columns}
-
-CSV Preview:
-{context}
-
-Question:
-{question}
-
-Answer:
-"""
-    )
-
-def build_csv_chat_graph(df: pd.DataFrame, metadata, llm):
-
-    prompt = build_prompt(metadata)
-    context = dataframe_to_context(df)
-
-    def generate_node(state: GraphState):
-        messages = prompt.format_messages(
-            question=state["question"],
-            context=context,
-            columns=", ".join(metadata["columns"]),
-            total_columns=metadata["total_columns"]
-        )
-        response = llm.invoke(messages)
-        return {"answer": response.content}
-
-    graph = StateGraph(GraphState)
-    graph.add_node("generate", generate_node)
-    graph.set_entry_point("generate")
-    graph.add_edge("generate", END)
-
-    return graph.compile()
+async def save_turn(user_id: str, file_id: str, question: str, answer: str):
+    key = (user_id, file_id)
+    entry = _turn_locks.setdefault(key, {"lock": asyncio.Lock(), "pending": 0})
+    entry["pending"] += 1
+    try:
+        async with entry["lock"]:
+            memory = ACTIVE_CHAT_CSV.memory(user_id, file_id) or empty_memory()
+            memory = await remember(llm, memory, question, answer)
+            ACTIVE_CHAT_CSV.save_memory(user_id, file_id, memory)
+    except Exception as e:
+        print(f"Chat turn not saved ====> {e}")
+    finally:
+        entry["pending"] -= 1
+        if entry["pending"] == 0:
+            del _turn_locks[key]
+
+
+def save_turn_later(user_id: str, session, question: str, answer: str):
+    # the event loop only keeps weak references to tasks
+    task = asyncio.create_task(save_turn(user_id, session["file_id"], question, answer))
+    _background_saves.add(task)
+    task.add_done_callback(_background_saves.discard)
+
+DISCONNECT_POLL_SECONDS = float(os.getenv("CHAT_DISCONNECT_POLL_SECONDS", "0.5"))
+# queue markers between the graph task and the SSE response
+STREAM_END = object()
+STREAM_DISCONNECTED = object()
+
+# Answers keyed by dataset fingerprint + normalized question, shared by all users
+ANSWER_CACHE = DiskCache(
+    "chat_answers",
+    max_bytes=int(os.getenv("CHAT_CACHE_MAX_MB", "64")) * 1024 * 1024,
+    ttl_seconds=int(os.getenv("CHAT_CACHE_TTL_SECONDS", "86400"))
+)
+
+
+def start_session(user_id: str, file_id: str, owned: bool = False):
+    """
+    Loading, fingerprinting and indexing take about a second per million
+    rows, the routes run this on the threadpool so the event loop stays free.
+    owned: the file is a chat-only upload, deleted with the session.
+    """
+    df = load_columnar(file_id)
+    ACTIVE_CHAT_CSV.put(user_id, file_id, df, get_csv_metadata(df), owned=owned)
+
+
+def open_uploaded_dataset(user_id: str, file_id: str, content: bytes):
+    temp_path = f"/tmp/chat_{file_id}.csv"
+    with open(temp_path, "wb") as f:
+        f.write(content)
+    try:
+        save_columnar(load_csv_once(temp_path), file_id)
+    finally:
+        os.remove(temp_path)
+    start_session(user_id, file_id, owned=True)
+
+
+def open_stored_dataset(user_id: str, file_id: str):
+    """
+    Make the columnar copy of one of the user's analyzed files available
+    locally and start a session on it.
+    """
+    supabase = get_supabase_client()
+    rows = supabase.table("files").select("*").eq(
+        "storage_path", f"{user_id}/{file_id}.csv"
+    ).execute().data
+    if not rows:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not has_columnar(file_id):
+        columnar_storage_path = rows[0].get("columnar_path")
+        if not columnar_storage_path:
+            raise HTTPException(status_code=409, detail="File has no columnar copy yet")
+        fetch_columnar(supabase, columnar_storage_path, file_id)
+    start_session(user_id, file_id)
+
 
 @chat_router.post("/upload")
 async def upload_csv_for_chat(
-    file: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
+    file_id: Optional[str] = None,
     user = Depends(get_current_user)
 ):
     try:
         user_id = str(user.id)
-        temp_path = f"/tmp/chat_{user_id}.csv"
-
-        content = await file.read()
-        with open(temp_path, "wb") as f:
-            f.write(content)
-
-        df = load_csv_once(temp_path)
-        metadata = get_csv_metadata(df)
-
-        graph = build_csv_chat_graph(
-            df=df,
-            metadata=metadata,
-            llm=llm
-        )
 
-        ACTIVE_CHAT_CSV[user_id] = {
-            "df": df,
-            "graph": graph,
-            "metadata": metadata
-        }
+        if file is not None:
+            file_id = str(uuid.uuid4())
+            content = await file.read()
+            await run_in_threadpool(open_uploaded_dataset, user_id, file_id, content)
+        elif file_id:
+            await run_in_threadpool(open_stored_dataset, user_id, file_id)
+        else:
+            raise HTTPException(status_code=400, detail="Upload a CSV or pass a file_id")
 
-        return {"message": "CSV uploaded. You can now chat with it."}
+        return {"message": "CSV uploaded. You can now chat with it.", "file_id": file_id}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
@@ -142,14 +157,165 @@ async def chat_with_csv(
     try:
         user_id = str(user.id)
 
-        if user_id not in ACTIVE_CHAT_CSV:
+        session = await run_in_threadpool(ACTIVE_CHAT_CSV.get, user_id)
+        if session is None:
             return {"error": "Upload a CSV first"}
 
-        graph = ACTIVE_CHAT_CSV[user_id]["graph"]
-
-        result = graph.invoke({"question": question})
-
+        memory = load_memory(user_id, session)
+        cache_key = None
+        with llm_user(user_id):
+            if session["metadata"].get("fingerprint"):
+                cache_key = answer_cache_key(session["metadata"], question, memory)
+                cached = ANSWER_CACHE.get(cache_key)
+                if cached is not None:
+                    save_turn_later(user_id, session, question, cached["answer"])
+                    return {"answer": cached["answer"], "cached": True}
+
+            graph = session["graph"]
+
+            result = await graph.ainvoke({
+                "question": question,
+                "history": memory["history"],
+                "summary": memory["summary"]
+            })
+
+            if cache_key is not None:
+                ANSWER_CACHE.set(cache_key, {"answer": result["answer"]})
+            save_turn_later(user_id, session, question, result["answer"])
         return {"answer": result["answer"]}
 
+    except asyncio.TimeoutError:
+        metrics.incr("chat.timeouts")
+        raise HTTPException(status_code=504, detail="The model took too long to answer")
     except Exception:
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@chat_router.get("/chat/stream")
+async def stream_chat_with_csv(
+    question: str,
+    request: Request,
+    user = Depends(get_current_user)
+):
+    """
+    Server-Sent Events: token events while the answer is generated, then done.
+    Closing the connection cancels the generation.
+    """
+    user_id = str(user.id)
+    session = await run_in_threadpool(ACTIVE_CHAT_CSV.get, user_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload a CSV first")
+    memory = load_memory(user_id, session)
+
+    def sse(event: str, data) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    async def event_stream():
+        with llm_user(user_id):
+            async for event in answer_events():
+                yield event
+
+    async def answer_events():
+        started = time.perf_counter()
+        cache_key = None
+        if session["metadata"].get("fingerprint"):
+            cache_key = answer_cache_key(session["metadata"], question, memory)
+            cached = ANSWER_CACHE.get(cache_key)
+            if cached is not None:
+                metrics.observe("chat.stream.ttfb_seconds", time.perf_counter() - started)
+                yield sse("token", {"text": cached["answer"]})
+                save_turn_later(user_id, session, question, cached["answer"])
+                yield sse("done", {"answer": cached["answer"], "cached": True})
+                return
+
+        # the graph runs in its own task, a watcher cancels it as soon as the
+        # client leaves, even while no token is arriving (planning, queueing)
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def run_graph():
+            try:
+                async for item in session["graph"].astream(
+                    {"question": question, "history": memory["history"], "summary": memory["summary"]},
+                    stream_mode=["messages", "updates"]
+                ):
+                    queue.put_nowait(item)
+            except Exception as e:
+                queue.put_nowait(e)
+                return
+            queue.put_nowait(STREAM_END)
+
+        async def watch_disconnect(task: asyncio.Task):
+            while not task.done():
+                if await request.is_disconnected():
+                    task.cancel()
+                    queue.put_nowait(STREAM_DISCONNECTED)
+                    return
+                await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+        graph_task = asyncio.create_task(run_graph())
+        watcher = asyncio.create_task(watch_disconnect(graph_task))
+        parts = []
+        answer = None
+        try:
+            while True:
+                item = await queue.get()
+                if item is STREAM_END:
+                    break
+                if item is STREAM_DISCONNECTED:
+                    metrics.incr("chat.stream.cancelled")
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                mode, payload = item
+                if mode == "updates":
+                    answer = (payload.get("generate") or {}).get("answer", answer)
+                    continue
+                chunk, meta = payload
+                # only the answer is streamed, the query plan is internal
+                if meta.get("langgraph_node") != "generate" or not chunk.content:
+                    continue
+                if not parts:
+                    metrics.observe("chat.stream.ttfb_seconds", time.perf_counter() - started)
+                parts.append(chunk.content)
+                yield sse("token", {"text": chunk.content})
+        except asyncio.TimeoutError:
+            metrics.incr("chat.timeouts")
+            yield sse("error", {"error": "The model took too long to answer"})
+            return
+        except Exception as e:
+            print(f"Chat stream failed ====> {e}")
+            yield sse("error", {"error": "Internal server error"})
+            return
+        finally:
+            # also reached when the response itself is cancelled
+            graph_task.cancel()
+            watcher.cancel()
+
+        # an answer shared with an identical request in flight arrives whole
+        if answer is None:
+            answer = "".join(parts)
+        if not parts and answer:
+            metrics.observe("chat.stream.ttfb_seconds", time.perf_counter() - started)
+            yield sse("token", {"text": answer})
+        if cache_key is not None:
+            ANSWER_CACHE.set(cache_key, {"answer": answer})
+        save_turn_later(user_id, session, question, answer)
+        metrics.observe("chat.stream.total_seconds", time.perf_counter() - started)
+        yield sse("done", {"answer": answer, "cached": False})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@chat_router.get("/session-stats", dependencies=[Depends(get_current_user)])
+def chat_session_stats():
+    return ACTIVE_CHAT_CSV.stats()
+
+
+@chat_router.get("/cache-stats", dependencies=[Depends(get_current_user)])
+def chat_cache_stats():
+    return ANSWER_CACHE.stats()
+
+
+@chat_router.get("/llm-stats", dependencies=[Depends(get_current_user)])
+def llm_stats():
+    return gateway.stats()
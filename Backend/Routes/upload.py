@@ -1,77 +1,264 @@
 from fastapi import APIRouter, UploadFile, File, Depends,HTTPException
-import uuid, os
+from fastapi.responses import StreamingResponse
+import uuid, os, json
 from Core.database import get_supabase_client
 from Utils.Security import get_current_user
-from Langgraph.graph import Analysis_graph
+from Langgraph.graph import run_analysis, PIPELINE_VERSION
 from Langgraph.states import DataState
 import traceback
 from Utils.sys_validation import sanitize
+from Core.columnar import has_columnar, fetch_columnar, upload_columnar, copy_columnar
+from Core.cache import DiskCache, content_hash
+from Core.jobs import submit_job, get_job, wait_job, follow_events
+from Core.llm import gateway
+from Agents.insight import Model as InsightModel
 
 upload_router = APIRouter(
     prefix="/upload",
     tags=["CSV Charts and Dashbaord Insights."]
 )
 
+# Whole-pipeline results keyed by file content + pipeline version,
+# only runs whose insights came back complete are stored
+RESULT_CACHE = DiskCache(
+    "analysis_results",
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_MB", "512")) * 1024 * 1024,
+    ttl_seconds=int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 86400)))
+)
+
+
+def process_upload(user_id: str, file_name: str, content: bytes, progress=None):
+    """
+    Blocking part of an upload, runs on the job worker pool.
+    """
+    supabase = get_supabase_client()
+
+    file_id = str(uuid.uuid4())
+    storage_path = f"{user_id}/{file_id}.csv"
+
+    #uploadstorage
+    supabase.storage.from_("csv-files").upload(
+        storage_path,
+        content,
+        {"content-type": "text/csv"}
+    )
+
+    #Metadata
+    supabase.table("files").insert({
+        "user_id": user_id,
+        "file_name": file_name,
+        "storage_path": storage_path
+    }).execute()
+
+    #byte-identical re-uploads reuse the stored analysis of the same model
+    cache_key = content_hash(
+        PIPELINE_VERSION,
+        gateway.backend,
+        InsightModel.model_name,
+        str(InsightModel.temperature),
+        content
+    )
+    cached = RESULT_CACHE.get(cache_key)
+    if cached is not None:
+        if cached.get("columnar_path"):
+            copy_columnar(supabase, cached["columnar_path"], user_id, file_id, storage_path)
+        if progress is not None:
+            progress("cache_hit", {"file_id": file_id})
+        return {
+            "message": "CSV processed successfully",
+            "file_id": file_id,
+            # the timings are those of the run that filled the cache
+            "result": {**cached["result"], "timing": None},
+            "cached": True
+        }
+
+    #tempfile
+    temp_path = f"/tmp/{file_id}.csv"
+    with open(temp_path, "wb") as f:
+        f.write(content)
+
+    initial_state: DataState = {
+    "file_path": temp_path,
+    "file_id": file_id,
+    "df": None,
+    "metadata": None,
+    "eda": None,
+    "charts": None,
+    "insights": None,
+    "report": None,
+    "summary": "",
+    "key_insights": [],
+    "risks": [],
+    "recommendations": [],
+    }
+
+    result = run_analysis(
+        initial_state,
+        config={"configurable":{"user_id":str(user_id)}},
+        progress=progress
+    )
+
+    #columnar copy for chat sessions and re-analysis
+    columnar_storage_path = None
+    if has_columnar(file_id):
+        columnar_storage_path = upload_columnar(supabase, str(user_id), file_id, storage_path)
+
+    insights_complete = bool(result.get("insights_complete"))
+    result = sanitize({
+    "metadata": result.get("metadata"),
+    "eda": result.get("eda"),
+    "charts": result.get("charts"),
+    "insights": result.get("insights"),
+    "report": result.get("report"),
+    "timing": result.get("timing"),
+    })
+    if insights_complete:
+        RESULT_CACHE.set(cache_key, {
+            "result": result,
+            "columnar_path": columnar_storage_path
+        })
+    return {
+        "message": "CSV processed successfully",
+        "file_id": file_id,
+        "result": result
+    }
+
+
+def process_reanalysis(user_id: str, file_id: str, progress=None):
+    """
+    Re-run the analysis of an uploaded file from its columnar copy,
+    falling back to the stored CSV for files converted before the cache existed.
+    """
+    supabase = get_supabase_client()
+    storage_path = f"{user_id}/{file_id}.csv"
+
+    rows = supabase.table("files").select("*").eq(
+        "storage_path", storage_path
+    ).execute().data
+    if not rows:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    temp_path = f"/tmp/{file_id}.csv"
+    columnar_storage_path = rows[0].get("columnar_path")
+    if columnar_storage_path:
+        fetch_columnar(supabase, columnar_storage_path, file_id)
+    elif not has_columnar(file_id):
+        content = supabase.storage.from_("csv-files").download(storage_path)
+        with open(temp_path, "wb") as f:
+            f.write(content)
+
+    initial_state: DataState = {
+    "file_path": temp_path,
+    "file_id": file_id,
+    "df": None,
+    "metadata": None,
+    "eda": None,
+    "charts": None,
+    "insights": None,
+    "report": None,
+    }
+
+    result = run_analysis(
+        initial_state,
+        config={"configurable":{"user_id":str(user_id)}},
+        progress=progress
+    )
+
+    if not columnar_storage_path and has_columnar(file_id):
+        upload_columnar(supabase, str(user_id), file_id, storage_path)
+
+    safe_result = sanitize({
+    "metadata": result.get("metadata"),
+    "eda": result.get("eda"),
+    "charts": result.get("charts"),
+    "insights": result.get("insights"),
+    "report": result.get("report"),
+    "timing": result.get("timing"),
+    })
+    return {
+        "message": "CSV re-analyzed successfully",
+        "file_id": file_id,
+        "result": safe_result
+    }
+
+
 @upload_router.post("/upload-csv")
 async def upload_csv(
     file: UploadFile = File(...),
-    user = Depends(get_current_user) 
+    user = Depends(get_current_user)
 ):
+    """
+    Waits for the analysis without blocking the event loop.
+    Use /upload/jobs to get a job id back immediately instead.
+    """
     try:
-        supabase = get_supabase_client()
-        user_id = user.id
+        content = await file.read()
+        job_id = submit_job(process_upload, str(user.id), file.filename, content, user_id=user.id)
+        return await wait_job(job_id)
+    except Exception as e:
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
 
-        file_id = str(uuid.uuid4())
-        storage_path = f"{user_id}/{file_id}.csv"
 
-        content = await file.read()
+@upload_router.post("/jobs")
+async def create_upload_job(
+    file: UploadFile = File(...),
+    user = Depends(get_current_user)
+):
+    content = await file.read()
+    job_id = submit_job(process_upload, str(user.id), file.filename, content, user_id=user.id)
+    return {"job_id": job_id, "status": "queued"}
 
-        #uploadstorage
-        supabase.storage.from_("csv-files").upload(
-            storage_path,
-            content,
-            {"content-type": "text/csv"}
-        )
-
-        #Metadata
-        supabase.table("files").insert({
-            "user_id": user_id,
-            "file_name": file.filename,
-            "storage_path": storage_path
-        }).execute()
-
-        #tempfile
-        temp_path = f"/tmp/{file_id}.csv"
-        with open(temp_path, "wb") as f:
-            f.write(content)
 
-        initial_state: DataState = {
-        "file_path": temp_path,
-        "df": None,
-        "metadata": None,
-        "eda": None,
-        "charts": None,
-        "insights": None,
-        "report": None,
-        "summary": "",
-        "key_insights": [],
-        "risks": [],
-        "recommendations": [],
-        }
+@upload_router.get("/jobs/{job_id}")
+def get_upload_job(
+    job_id: str,
+    user = Depends(get_current_user)
+):
+    job = get_job(job_id, user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-        result = Analysis_graph.invoke(initial_state,config={"configurable":{"user_id":str(user_id)}})
-        safe_result = {
-        "metadata": result.get("metadata"),
-        "eda": result.get("eda"),
-        "charts": result.get("charts"),
-        "insights": result.get("insights"),
-        "report": result.get("report"),
-        }
-        result = sanitize(safe_result)
-        return {
-            "message": "CSV processed successfully",
-            "result": safe_result
-        }
+
+@upload_router.get("/jobs/{job_id}/events")
+async def stream_upload_job(
+    job_id: str,
+    last_event_id: int = -1,
+    user = Depends(get_current_user)
+):
+    """
+    Server-Sent Events: one event per pipeline node, then the final result.
+    """
+    if get_job(job_id, user.id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for event in follow_events(job_id, last_event_id):
+            data = event["data"]
+            if event["type"] == "completed":
+                job = get_job(job_id, user.id)
+                data = {"result": job["result"] if job else None}
+            yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@upload_router.post("/reanalyze/{file_id}")
+async def reanalyze_csv(
+    file_id: str,
+    user = Depends(get_current_user)
+):
+    try:
+        job_id = submit_job(process_reanalysis, str(user.id), file_id, user_id=user.id)
+        return await wait_job(job_id)
+    except HTTPException:
+        raise
     except Exception as e:
         print(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@upload_router.get("/cache-stats", dependencies=[Depends(get_current_user)])
+def result_cache_stats():
+    return RESULT_CACHE.stats()
@@ -1,9 +1,11 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from Routes.auth import router
 from Routes.upload import upload_router
 from Routes.chat import chat_router
 from Routes.contact import contact_router
 from fastapi.middleware.cors import CORSMiddleware
+from Core import metrics
+from Utils.Security import get_current_user
 
 app = FastAPI(title="DataSage",description="User will pass csv and we will prove him/her detail insights.")
 
@@ -22,6 +24,10 @@ def welcome():
         "message" : "App is up"
     }
 
+@app.get('/metrics', dependencies=[Depends(get_current_user)])
+def get_metrics():
+    return metrics.snapshot()
+
 app.include_router(router)
 app.include_router(upload_router)
 app.include_router(chat_router)
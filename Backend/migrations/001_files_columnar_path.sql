@@ -0,0 +1,3 @@
+-- Columnar (Arrow) copy of each analyzed upload, stored next to the CSV in
+-- the csv-files bucket. Run once in the Supabase SQL editor.
+alter table public.files add column if not exists columnar_path text;